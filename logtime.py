@@ -11,392 +11,2223 @@
 #-------------------------------------------------------------------------------
 
 
-from datetime import datetime, timedelta
+from __future__ import print_function
+from datetime import timedelta
 from optparse import OptionParser
-from itertools import izip
+from itertools import groupby, islice, repeat
+from array import array
+from multiprocessing import Pool, cpu_count
+from collections import deque, namedtuple, OrderedDict
+from bisect import bisect_right
+import bz2
+import calendar
+import glob
+import hashlib
+import heapq
+import io
+import json
+import mmap
+import os
 import re
+import sqlite3
 import csv
+import sys
+import threading
+import time
+import zipfile
+import zlib
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+try:
+    import resource
+except ImportError:
+    resource = None
+
+#Python 2 / 3 compatibility
+try:
+    from itertools import imap, izip
+except ImportError:
+    imap, izip = map, zip
+try:
+    from Queue import Queue
+except ImportError:
+    from queue import Queue
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+if sys.version_info[0] >= 3:
+    from sys import intern
+if hasattr(array, 'tobytes'):
+    array_tobytes, array_frombytes = array.tobytes, array.frombytes
+else:
+    array_tobytes, array_frombytes = array.tostring, array.fromstring
+
+if str is bytes:
+    def text_lines(lines):
+        """Return log lines for the patterns to search; on Python 2 these are the byte strings read"""
+        return lines
+
+    def open_output(path, mode='w'):
+        """Open an output file, in binary mode as the csv module needs on Python 2"""
+        return open(path, mode + 'b')
+
+    def json_line(value):
+        """Encode a value as a line of JSON, reading its byte strings as Latin-1 as the log lines are on Python 3"""
+        return json.dumps(value, encoding='latin-1') + '\n'
+
+    def text_arg(arg):
+        """Return a command line argument to match against log lines; on Python 2 these are the bytes given"""
+        return arg
+
+    def latin1_console():
+        """Leave console output as it is on Python 2, where printing byte strings writes them unchanged"""
+        pass
+else:
+    def text_lines(lines):
+        """Decode log lines read as bytes for the patterns to search
+
+        Latin-1 maps every byte to one character, so line lengths stay byte offsets into the log,
+        and writing output as Latin-1 gives back the bytes of the log unchanged.
+        """
+        for line in lines:
+            yield line if isinstance(line, str) else line.decode('latin-1')
+
+    def open_output(path, mode='w'):
+        """Open an output file as Latin-1 text, see text_lines"""
+        return open(path, mode, newline='', encoding='latin-1')
+
+    def json_line(value):
+        """Encode a value as a line of JSON"""
+        return json.dumps(value) + '\n'
+
+    def text_arg(arg):
+        """Decode a command line argument like the log lines, from the bytes it was given as, see text_lines"""
+        return os.fsencode(arg).decode('latin-1')
+
+    def latin1_console():
+        """Print Latin-1 to the console, so the text of log lines is output as the bytes they were logged as"""
+        #detached rather than wrapped twice, as closing the old wrapper would close the console too
+        line_buffering = sys.stdout.line_buffering
+        sys.stdout = io.TextIOWrapper(sys.stdout.detach(), encoding='latin-1', line_buffering=line_buffering)
 
 #Nexpose log timestamp format, used for converting times
 time_format = '%Y-%m-%dT%H:%M:%S'
-default_timestamp = timedelta(0)
+#bumped whenever the layout of the parser state changes, so stale checkpoints are not loaded
+checkpoint_version = 9
+#bumped whenever the layout of the log index changes, so stale indexes are rebuilt
+index_version = 1
+#bumped whenever the layout of cached parse results changes, along with checkpoint_version
+cache_version = 3
+#how many evenly spaced samples of each log, of what size, are hashed to tell changed logs apart
+cache_samples = 16
+cache_sample_size = 64 * 1024
+#asset fields stored column by column in cached parse results, besides the array of values of each asset
+cache_string_fields = ('sitename', 'urls', 'fingerprint_certainty')
+#the array of values of a new asset: last timestamp, ALIVE, first TCP port, first UDP port, node scan
+#start and end, and web spider start and end timestamps, and vulnerabilities, followed by open ports
+#from port_index on; unsigned 32-bit timestamps run to 2106
+asset_values = array('I', [0] * 9)
+port_index = 9
+#added to UDP ports to tell them apart from TCP ports in the array of values
+udp_port_flag = 0x10000
+#the log index: the byte offset and line context (timestamp and site) of every line with a scan event,
+#plus the first and last lines of every site and IP, which set the site of an asset and when it was last seen
+index_schema = '''
+CREATE TABLE meta (key TEXT PRIMARY KEY, value);
+CREATE TABLE lines (offset INTEGER PRIMARY KEY, timestamp INTEGER, site TEXT, ip TEXT, events TEXT);
+CREATE INDEX lines_site ON lines (site);
+CREATE INDEX lines_ip ON lines (ip);
+CREATE TABLE sites (site TEXT PRIMARY KEY, first_offset INTEGER, first_timestamp INTEGER, last_offset INTEGER, last_timestamp INTEGER);
+CREATE TABLE ips (ip TEXT PRIMARY KEY, site TEXT, first_offset INTEGER, first_timestamp INTEGER, last_offset INTEGER, last_site TEXT, last_timestamp INTEGER);
+CREATE INDEX ips_site ON ips (site);
+'''
+#compressed log formats, and decompressors for those not read as archives, by file extension
+compressed_extensions = ('.gz', '.bz2', '.xz', '.zip')
+decompressors = {'.gz': lambda: zlib.decompressobj(16 + zlib.MAX_WBITS), '.bz2': bz2.BZ2Decompressor}
+if lzma is not None:
+    decompressors['.xz'] = lzma.LZMADecompressor
+#size of the blocks compressed logs are read in, and how many are decompressed ahead of the parser
+block_size = 1024 * 1024
+#logs compress around 10-20x, so compressed input is read in smaller blocks to decompress to about block_size
+compressed_block_size = 64 * 1024
+prefetch_blocks_ahead = 16
+prefetch_timeout = 24 * 60 * 60
+#grace windows of log time the keys of streamed out assets are remembered for, to tell stray lines apart
+stream_memory = 10
+#clock used by --profile, seconds between its lines/sec samples, and the time slices its table shows them in
+profile_timer = getattr(time, 'perf_counter', time.time)
+profile_interval = 1.0
+profile_slices = 10
+#stages of a profiled run, in the order they are reported, and the empty timed sections the cost of timing one is measured over
+profile_phases = ('ingest', 'timestamps', 'patterns', 'events', 'aggregation', 'profiling', 'output')
+profile_calibration = 100000
+#scan phases summarized per site, percentiles reported for them, and upper bounds in seconds of their histogram bins
+phases = (('discovery', 'Discovery'), ('node', 'Node'), ('spider', 'Web Spider'), ('total', 'Total'))
+percentile_points = (50, 90, 99)
+histogram_bounds = (60, 5 * 60, 15 * 60, 60 * 60, 4 * 60 * 60)
+histogram_labels = ['<%s' % timedelta(seconds=bound) for bound in histogram_bounds] + ['>=%s' % timedelta(seconds=histogram_bounds[-1])]
 
 #csv headers
 headers = ['Site', 'Asset', 'Open TCP Ports', 'Open UDP Ports', 'Discovery Duration', 'URLs Spidered', 'Spider Duration', 'Node Duration', 'Total Duration', 'Completed', 'TCP Port List', 'UDP Port List', 'Vulnerabilities', 'Fingerprint Certainty']
 summary_headers = ['Site', 'Assets Logged', 'Live Assets', 'Assets Scanned', 'Total Scan Duration', 'High Duration Asset', 'High Duration', 'Low Duration Asset', 'Low Duration']
+for phase, title in phases:
+    summary_headers += ['%s Average' % title] + ['%s p%i' % (title, point) for point in percentile_points] + ['%s Histogram' % title, 'Slowest %s Assets' % title]
+run_headers = ['Site', 'Run', 'Started', 'Ended', 'Completed', 'Scan Duration', 'Pauses', 'Assets Logged', 'Live Assets', 'Assets Scanned', 'High Duration Asset', 'High Duration'] + ['%s Average' % title for phase, title in phases] + ['Total p%i' % point for point in percentile_points]
 
 #match site name
-sitePattern = re.compile('\[Site: (?P<site>.*?)\]')
-#match scan start / pause / stop (TODO: use this to split a nse.log)
+sitePattern = re.compile(r'\[Site: (?P<site>.*?)\]')
+#match scan start / pause / stop, also used to split a log into scan runs (see find_scan_runs)
 scanStartPattern = re.compile('Scan for site')
 scanPausePattern = re.compile('Scan paused')
-scanStopPattern = re.compile('\[Site: .*?\] (Scan stopped|Scan completed)')
+scanStopPattern = re.compile(r'\[Site: .*?\] (Scan stopped|Scan completed)')
 #should match any ipv4 address (now constrained to be within brackets)
-ipPattern = re.compile('[:\[](?P<ip>\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})[:\]]')
-ipPattern2 = re.compile('[:\[|\[Target: ](\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})[:\]]')
+ipPattern = re.compile(r'[:\[](?P<ip>\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})[:\]]')
+ipPattern2 = re.compile(r'[:\[|\[Target: ](\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})[:\]]')
 #matches Nexpose log timestamp format
 timePattern = re.compile('^(19[0-9]{2}|2[0-9]{3})-(0[1-9]|1[012])-([123]0|[012][1-9]|31)T([01][0-9]|2[0-3]):([0-5][0-9]):([0-5][0-9])')
 #matches keywords in Nexpose logs
 startPattern = re.compile('starting node scan')
 endPattern = re.compile('Freeing node cache data')
 #updated nmap log message regexes
-alivePattern = re.compile('\[(?P<ip>\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})\] ALIVE \(reason=(.*?):')
-deadPattern = re.compile('\[(?P<ip>\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})\] DEAD \(reason=(.*?)\)')
-tcpPattern = re.compile('\[(?P<ip>\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}):(?P<port>\d{0,5})/TCP\] OPEN \(reason=(?P<reason>.*?):')
-udpPattern = re.compile('\[(?P<ip>\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}):(?P<port>\d{0,5})/UDP\] OPEN \(reason=(?P<reason>.*?):')
+alivePattern = re.compile(r'\[(?P<ip>\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})\] ALIVE \(reason=(.*?):')
+deadPattern = re.compile(r'\[(?P<ip>\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})\] DEAD \(reason=(.*?)\)')
+tcpPattern = re.compile(r'\[(?P<ip>\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}):(?P<port>\d{0,5})/TCP\] OPEN \(reason=(?P<reason>.*?):')
+udpPattern = re.compile(r'\[(?P<ip>\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}):(?P<port>\d{0,5})/UDP\] OPEN \(reason=(?P<reason>.*?):')
 udp2Pattern = re.compile('maybe open UDP ports')
-spiderStartPattern = re.compile('\[Thread: SPIDER::do-http-spiderv2-setup@\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}\] \[Site: (?P<site>.*?)\] \[(?P<ip>\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}):(?P<port>\d{1,5})\]')
-spiderEndPattern = re.compile('\[Thread: .*?:\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}\] \[Site: (?P<site>.*?)\] \[(?P<ip>\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})\] Closing service: Ne[Xx]poseWebSpider\[\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}:(?P<port>\d{1,5})\]  \(source: (?P<source>.*?)\)')
-spiderSummaryPattern = re.compile('\[Thread: .*?:(?P<ip>\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})\] \[Site: (?P<site>.*?)\] Shutting down spider \((?P<urls>.*?) URLs spidered in')
-sysFingerprintPattern = re.compile('\[(?P<ip>\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})\] (?P<action>.*?) SystemFingerprint.*?\[certainty=(?P<certainty>.*?)\]\[description=(?P<description>.*?)\].*? source: (?P<source>.*?)$')
+spiderStartPattern = re.compile(r'\[Thread: SPIDER::do-http-spiderv2-setup@\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}\] \[Site: (?P<site>.*?)\] \[(?P<ip>\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}):(?P<port>\d{1,5})\]')
+spiderEndPattern = re.compile(r'\[Thread: .*?:\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}\] \[Site: (?P<site>.*?)\] \[(?P<ip>\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})\] Closing service: Ne[Xx]poseWebSpider\[\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}:(?P<port>\d{1,5})\]  \(source: (?P<source>.*?)\)')
+spiderSummaryPattern = re.compile(r'\[Thread: .*?:(?P<ip>\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})\] \[Site: (?P<site>.*?)\] Shutting down spider \((?P<urls>.*?) URLs spidered in')
+sysFingerprintPattern = re.compile(r'\[(?P<ip>\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})\] (?P<action>.*?) SystemFingerprint.*?\[certainty=(?P<certainty>.*?)\]\[description=(?P<description>.*?)\].*? source: (?P<source>.*?)$')
 vulnerablePattern = re.compile('- VULNERABLE')
 
+#literal markers that must appear in a line for the paired pattern to be able to match;
+#patterns with no marker are tried on every line (timestamps are handled by parse_lines)
+linePatterns = (
+    ('ip', None, ipPattern),
+    ('site_name', '[Site: ', sitePattern),
+    ('scan_start', 'Scan for site', scanStartPattern),
+    ('scan_pause', 'Scan paused', scanPausePattern),
+    ('scan_stop', '] Scan ', scanStopPattern),
+    ('alive', '] ALIVE (reason=', alivePattern),
+    ('dead', '] DEAD (reason=', deadPattern),
+    ('tcp_port', '/TCP] OPEN (reason=', tcpPattern),
+    ('udp_port', '/UDP] OPEN (reason=', udpPattern),
+    ('node_start', 'starting node scan', startPattern),
+    ('node_end', 'Freeing node cache data', endPattern),
+    ('spider_start', 'SPIDER::do-http-spiderv2-setup@', spiderStartPattern),
+    ('spider_end', 'Closing service: Ne', spiderEndPattern),
+    ('spider_summary', 'Shutting down spider (', spiderSummaryPattern),
+    ('system_fingerprint', 'SystemFingerprint', sysFingerprintPattern),
+    ('vuln', '- VULNERABLE', vulnerablePattern),
+)
+
+#the fields of the scan events yielded by iter_events: type is one of event_types, timestamp the epoch
+#seconds of the line (or of the last line with a timestamp) and site the site named on or before it;
+#ip is the address of the asset the event is about, and value the (port number, reason) of tcp_open and
+#udp_open events, the URL count of spider_summary events and the certainty of fingerprint events.
+#Events are yielded as plain tuples, several times faster to create; Event._make(event) names the fields.
+Event = namedtuple('Event', ('type', 'timestamp', 'site', 'ip', 'value'))
+event_types = ('timestamp', 'site', 'scan_start', 'scan_pause', 'scan_stop', 'asset', 'alive', 'dead', 'tcp_open', 'udp_open', 'node_start', 'node_end', 'spider_start', 'spider_end', 'spider_summary', 'vuln', 'fingerprint')
+
+def classify_line(line):
+    """Return a dictionary of event name to match object for every pattern matching line."""
+    events = {}
+    for event, marker, pattern in linePatterns:
+        if marker is None or marker in line:
+            match = pattern.search(line)
+            if match:
+                events[event] = match
+    return events
+
+def asset_value(index):
+    """Property for the asset field kept at an index of the array of values of an asset"""
+    def get(self):
+        return self.values[index]
+    def set(self, value):
+        self.values[index] = value
+    return property(get, set)
+
+class Asset(object):
+    """Compact record of the scan events of one asset, used instead of a dictionary per asset
+
+    The timestamps (integer epoch seconds, 0 when unset) and vulnerability count of an asset
+    share one array('I') of values, followed by its open ports with UDP ports offset by
+    udp_port_flag, so a record is one small object and one array. Item access
+    (asset['nodestart']) is supported for code that treats assets as dictionaries.
+    """
+    __slots__ = ('sitename', 'values', 'urls', 'fingerprint_certainty')
+
+    alive = asset_value(1)
+    tcptime = asset_value(2)
+    udptime = asset_value(3)
+    nodestart = asset_value(4)
+    nodeend = asset_value(5)
+    spiderstart = asset_value(6)
+    spiderend = asset_value(7)
+    vulns = asset_value(8)
+
+    def __init__(self, site, timestamp):
+        self.sitename = site
+        self.values = asset_values[:]
+        self.values[0] = timestamp or 0
+        self.urls = 0
+        self.fingerprint_certainty = ''
+
+    @property
+    def last_timestamp(self):
+        #lines logged before the first timestamped line have none
+        return self.values[0] or None
+
+    @last_timestamp.setter
+    def last_timestamp(self, timestamp):
+        self.values[0] = timestamp or 0
+
+    @property
+    def completed(self):
+        #a node scan end is only ever recorded together with completion
+        return 'Yes' if self.nodeend else 'No'
+
+    @property
+    def tcpportlist(self):
+        return array('H', (port for port in islice(self.values, port_index, None) if port < udp_port_flag))
+
+    @property
+    def udpportlist(self):
+        return array('H', (port - udp_port_flag for port in islice(self.values, port_index, None) if port >= udp_port_flag))
+
+    @property
+    def tcpports(self):
+        return len(self.tcpportlist)
+
+    @property
+    def udpports(self):
+        return len(self.udpportlist)
+
+    def set_ports(self, tcpportlist, udpportlist):
+        """Replace the open ports of the asset"""
+        del self.values[port_index:]
+        self.values.extend(port for port in tcpportlist)
+        self.values.extend(port + udp_port_flag for port in udpportlist)
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
+
+    def __getstate__(self):
+        return (self.sitename, self.values, self.urls, self.fingerprint_certainty)
+
+    def __setstate__(self, state):
+        #unpacked in one statement, as this runs for every asset loaded from a cache or checkpoint
+        self.sitename, self.values, self.urls, self.fingerprint_certainty = state
+
+def ip_key(ip):
+    """Convert a dotted IPv4 address to the 32-bit integer assets are keyed by"""
+    octets = [int(octet) for octet in ip.split('.')]
+    if max(octets) > 255:
+        #not a valid address, keep the text so it still gets a record of its own
+        return ip
+    return (octets[0] << 24) | (octets[1] << 16) | (octets[2] << 8) | octets[3]
+
+def format_ip(key):
+    """Convert an asset key back to a dotted IPv4 address"""
+    if isinstance(key, str):
+        return key
+    return '{0}.{1}.{2}.{3}'.format(key >> 24, (key >> 16) & 255, (key >> 8) & 255, key & 255)
+
+def port_number(port):
+    """Convert a logged port to a number for array('H') storage, 0 if it is not a valid port"""
+    if port.isdigit() and int(port) <= 65535:
+        return int(port)
+    return 0
+
+def init_totals():
+    """Create dictionary for the running totals of the assets of a site
+
+    longest and shortest are (total duration, asset key) pairs, durations counts the assets
+    of each scan phase by duration in seconds, timed is the number of them, and slowest a heap
+    of the slowest as (duration, -sequence number, asset key), so that ties go to the asset seen first.
+    """
+    #counting by duration keeps the totals bounded by the longest duration, not the number of assets
+    totals_dict = {'assets':0, 'alive':0, 'scanned':0, 'longest':None, 'shortest':None, 'durations':dict((phase, {}) for phase, title in phases), 'timed':dict((phase, 0) for phase, title in phases), 'slowest':dict((phase, []) for phase, title in phases)}
+    return totals_dict
+
+def init_site(timestamp):
+    """Create dictionary for a newly added site
+
+    assets lists the keys of the site's asset records in the order they were first seen,
+    and totals holds the running totals of the assets already streamed out and evicted.
+    """
+    site_dict = {'scan_start':[], 'scan_pause':[], 'scan_stop':[], 'scan_durations':[], 'scan_total_duration':'', 'last_timestamp':timestamp, 'first_timestamp':timestamp, 'dead_ips':[], 'assets':[], 'totals':init_totals(), 'completed': 'No'}
+    return site_dict
+
+def init_state():
+    """Create dictionary for the parser state of a log, or of a chunk of one
+
+    site_order and asset_order record the order sites and assets were first seen in,
+    dead_seen holds the last timestamp of DEAD lines for IPs without an asset record,
+    and timestamp / sitename carry the line context over to the next line parsed.
+    When the logs of several scan engines are aggregated, site_engines lists the engines
+    that logged each site and asset_engines names those that logged each asset.
+    When streaming, pending holds (node end timestamp, asset key) pairs of completed assets
+    waiting out the grace window, pending_dead (timestamp, asset key, site) triples of DEAD
+    lines for IPs without an asset record, evicted counts the assets streamed out since the
+    order lists were last compacted, streamed maps the keys of the assets streamed out to
+    the log time they were streamed out at, streamed_order lists those (timestamp, asset key)
+    pairs in order until they are forgotten, and stray counts the lines logged for those
+    assets after they were streamed out.
+    """
+    state_dict = {'sitedata':{}, 'assetdata':{}, 'site_order':[], 'asset_order':[], 'dead_seen':{}, 'pending':deque(), 'pending_dead':deque(), 'evicted':0, 'streamed':{}, 'streamed_order':deque(), 'stray':0, 'timestamp':None, 'sitename':None, 'site_engines':{}, 'asset_engines':{}}
+    return state_dict
+
+def parse_timestamp(text, day_epochs={}):
+    """Convert a fixed-width YYYY-MM-DDTHH:MM:SS log timestamp to integer epoch seconds
+
+    The epoch of each day is cached, leaving only the time of day to convert per call.
+    """
+    day = text[:10]
+    if day not in day_epochs:
+        day_epochs[day] = calendar.timegm((int(text[0:4]), int(text[5:7]), int(text[8:10]), 0, 0, 0))
+    return day_epochs[day] + int(text[11:13]) * 3600 + int(text[14:16]) * 60 + int(text[17:19])
+
+def format_timestamp(timestamp):
+    """Convert integer epoch seconds back to the log timestamp format"""
+    if timestamp is None:
+        return 'Unknown'
+    return time.strftime(time_format, time.gmtime(timestamp))
+
+def calc_duration(start, end):
+    """Calculate the duration in seconds between two timestamps"""
+    duration = end - start
+    return duration
+
+def format_duration(duration):
+    """Format a duration in seconds for output, passing 'Unknown' through"""
+    if duration == 'Unknown':
+        return duration
+    return timedelta(seconds=duration)
+
+def average_duration(counts, total):
+    """Average durations in seconds counted by value, using integer microseconds like timedelta division"""
+    if not total:
+        return 'Unknown'
+    return timedelta(microseconds=sum(duration * count for duration, count in counts.items()) * 1000000 // total)
+
+def percentile(ordered, total, point):
+    """Calculate a percentile of sorted (duration, count) pairs, interpolating between ranks like numpy.percentile"""
+    rank = (total - 1) * point / 100.0
+    low = int(rank)
+    high = min(low + 1, total - 1)
+    seen = 0
+    low_value = None
+    for duration, count in ordered:
+        seen += count
+        if low_value is None and low < seen:
+            low_value = duration
+        if high < seen:
+            return low_value + (duration - low_value) * (rank - low)
+
+def duration_stats(counts, total, slowest):
+    """Calculate the average, percentiles and histogram of durations counted by value, and rank the slowest
+
+    total is the number of durations counted, and slowest the heap of the slowest durations
+    kept in the running totals.
+    """
+    stats = {'average':average_duration(counts, total), 'percentiles':['Unknown'] * len(percentile_points), 'histogram':[0] * len(histogram_labels), 'slowest':[]}
+    if not total:
+        return stats
+    ordered = sorted(counts.items())
+    stats['percentiles'] = [percentile(ordered, total, point) for point in percentile_points]
+    for duration, count in ordered:
+        stats['histogram'][bisect_right(histogram_bounds, duration)] += count
+    stats['slowest'] = [(duration, key) for duration, sequence, key in sorted(slowest, reverse=True)]
+    return stats
+
+def add_slowest(heap, entry, top):
+    """Keep a (duration, -sequence number, asset key) entry if it is among the top slowest in the heap"""
+    #a heap of the N slowest seen so far, instead of sorting every duration
+    if len(heap) < top:
+        heapq.heappush(heap, entry)
+    elif heap and entry > heap[0]:
+        heapq.heapreplace(heap, entry)
+
+def asset_durations(record, site):
+    """Calculate the discovery, node, web spider and total durations of an asset, in the order of phases"""
+    if record.nodeend and record.nodestart:
+        nodetime = calc_duration(record.nodestart, record.nodeend)
+    elif record.nodestart:
+        nodetime = calc_duration(record.nodestart, record.last_timestamp)
+    else:
+        nodetime = 'Unknown'
+
+    #a log that starts part way through a scan, or is out of order, may have no scan start yet
+    if not site['scan_start']:
+        discoverytime = 'Unknown'
+    elif record.alive:
+        discoverytime = calc_duration(site['scan_start'][0], record.alive)
+    elif record.tcptime:
+        discoverytime = calc_duration(site['scan_start'][0], record.tcptime)
+    elif record.udptime:
+        discoverytime = calc_duration(site['scan_start'][0], record.udptime)
+    else:
+        discoverytime = 'Unknown'
+
+    if record.spiderend and record.spiderstart:
+        spidertime = calc_duration(record.spiderstart, record.spiderend)
+    elif record.spiderstart:
+        spidertime = calc_duration(record.spiderstart, record.last_timestamp)
+    else:
+        spidertime = 'Unknown'
+
+    if discoverytime != 'Unknown' and nodetime != 'Unknown':
+        totaltime = discoverytime + nodetime
+    else:
+        totaltime = 'Unknown'
+
+    return discoverytime, nodetime, spidertime, totaltime
+
+def asset_row(key, record, durations):
+    """Build the CSV row of an asset"""
+    discoverytime, nodetime, spidertime, totaltime = durations
+    return (record.sitename, format_ip(key), record.tcpports, record.udpports, str(format_duration(discoverytime)), str(record.urls), str(format_duration(spidertime)), str(format_duration(nodetime)), str(format_duration(totaltime)), record.completed, ', '.join(str(port) for port in record.tcpportlist), ', '.join(str(port) for port in record.udpportlist), str(record.vulns), str(record.fingerprint_certainty) )
+
+def fold_asset(totals, key, record, durations, top):
+    """Add an asset and its phase durations to the running totals of its site"""
+    totals['assets'] += 1
+    if record.alive:
+        totals['alive'] += 1
+    if record.nodeend:
+        totals['scanned'] += 1
+
+    totaltime = durations[-1]
+    if totaltime != 'Unknown':
+        if totals['longest'] is None or totaltime > totals['longest'][0]:
+            totals['longest'] = (totaltime, key)
+        if totals['shortest'] is None or totaltime < totals['shortest'][0]:
+            totals['shortest'] = (totaltime, key)
+
+    for (phase, title), duration in izip(phases, durations):
+        if duration != 'Unknown':
+            timed = totals['timed'][phase]
+            add_slowest(totals['slowest'][phase], (duration, -timed, key), top)
+            totals['timed'][phase] = timed + 1
+            counts = totals['durations'][phase]
+            counts[duration] = counts.get(duration, 0) + 1
+
+def merge_totals(totals, part, top=None):
+    """Fold the running totals of a site from a later part of the log into earlier ones
+
+    The heaps of slowest assets are trimmed to the top N when top is given.
+    """
+    for count in ('assets', 'alive', 'scanned'):
+        totals[count] += part[count]
+    if part['longest'] is not None and (totals['longest'] is None or part['longest'][0] > totals['longest'][0]):
+        totals['longest'] = part['longest']
+    if part['shortest'] is not None and (totals['shortest'] is None or part['shortest'][0] < totals['shortest'][0]):
+        totals['shortest'] = part['shortest']
+    for phase, title in phases:
+        timed = totals['timed'][phase]
+        heap = totals['slowest'][phase]
+        #renumber the later entries to follow the earlier ones
+        for duration, sequence, key in part['slowest'][phase]:
+            heapq.heappush(heap, (duration, sequence - timed, key))
+        while top is not None and len(heap) > top:
+            heapq.heappop(heap)
+        totals['timed'][phase] = timed + part['timed'][phase]
+        counts = totals['durations'][phase]
+        for duration, count in part['durations'][phase].items():
+            counts[duration] = counts.get(duration, 0) + count
+
+def init_stream(output, grace, top):
+    """Create dictionary for streaming out completed assets
+
+    output is called with the asset key, record and phase durations of every completed asset,
+    grace is the seconds of log time its record is kept for stray lines after its node scan
+    ended, and top the number of slowest assets kept in the running totals of each site.
+    The keys of streamed out assets are remembered for stream_memory grace windows of log time.
+    """
+    stream_dict = {'output':output, 'grace':grace, 'memory':max(grace, 1) * stream_memory, 'top':top}
+    return stream_dict
+
+def forget_streamed(state, before):
+    """Forget the keys of the assets streamed out before a log timestamp, so their IPs can be logged anew"""
+    streamed = state['streamed']
+    streamed_order = state['streamed_order']
+    while streamed_order and streamed_order[0][0] < before:
+        ended, key = streamed_order.popleft()
+        #a key streamed out again later stays until its later entry is forgotten
+        if streamed.get(key) == ended:
+            del streamed[key]
+
+def compact_order(state):
+    """Drop the keys of evicted assets from the first-seen order lists"""
+    assetdata = state['assetdata']
+    #assigned in place, as parse_lines holds references to the lists
+    state['asset_order'][:] = [key for key in state['asset_order'] if key in assetdata]
+    for site in state['sitedata'].values():
+        site['assets'][:] = [key for key in site['assets'] if key in assetdata]
+    state['evicted'] = 0
+
+def stream_completed(state, stream, before=None):
+    """Stream out the completed assets whose node scan ended before a log timestamp, and evict them
+
+    Without a timestamp, every completed asset still pending is streamed out. IPs only ever
+    logged DEAD are counted in the totals of their site once they wait out the grace window too.
+    """
+    pending = state['pending']
+    assetdata = state['assetdata']
+    streamed = state['streamed']
+    pending_dead = state['pending_dead']
+    while pending_dead and (before is None or pending_dead[0][0] < before):
+        ended, key, sitename = pending_dead.popleft()
+        site = state['sitedata'].get(sitename)
+        if key in assetdata or key in streamed or site is None:
+            #given a record by a later line, or counted after an earlier DEAD line
+            continue
+        site['totals']['assets'] += 1
+        streamed[key] = ended
+        state['streamed_order'].append((ended, key))
+    while pending and (before is None or pending[0][0] < before):
+        ended, key = pending.popleft()
+        record = assetdata.pop(key, None)
+        if record is None:
+            #already streamed out after an earlier node end line
+            continue
+        state['evicted'] += 1
+        streamed[key] = ended
+        state['streamed_order'].append((ended, key))
+        site = state['sitedata'].get(record.sitename)
+        if site is None:
+            #assets seen before any site name are never reported
+            continue
+        durations = asset_durations(record, site)
+        fold_asset(site['totals'], key, record, durations, stream['top'])
+        stream['output'](key, record, durations)
+    #compacting only once half the listed assets are gone keeps it linear overall
+    if state['evicted'] > len(state['asset_order']) // 2:
+        compact_order(state)
+
+def format_percentiles(values):
+    """Format percentile durations for output"""
+    return ' / '.join(str(format_duration(value)) for value in values)
+
+def format_histogram(counts):
+    """Format histogram bin counts for output"""
+    return ', '.join('%s: %i' % (label, count) for label, count in izip(histogram_labels, counts))
+
+def format_slowest(slowest):
+    """Format (duration, asset key) pairs for output"""
+    return ', '.join('%s @ %s' % (format_ip(key), format_duration(duration)) for duration, key in slowest)
+
+def no_output(site, message, timestamp):
+    """Discard a verbose message, used when parsing without verbose output."""
+    pass
+
+def init_profile():
+    """Create dictionary for profiling a run (see --profile)
+
+    patterns holds [searches, matches, seconds] for every line pattern and for the timestamps,
+    events [count, seconds aggregating] for every event type, phases the seconds spent in each of
+    profile_phases, parse the seconds spent parsing in all, and samples the (seconds since start,
+    lines, bytes) read so far, taken every profile_interval seconds.
+    """
+    profile_dict = {'start':profile_timer(), 'patterns':OrderedDict((event, [0, 0, 0.0]) for event in ['timestamp'] + [event for event, marker, pattern in linePatterns]),
+                    'events':OrderedDict((event, [0, 0.0]) for event in event_types), 'phases':dict((phase, 0.0) for phase in profile_phases),
+                    'parse':0.0, 'lines':0, 'bytes':0, 'samples':[], 'next_sample':0.0}
+    return profile_dict
+
+def profile_functions(profile):
+    """Return versions of classify_line, timePattern.match and parse_timestamp that time their work into the profile"""
+    timer = profile_timer
+    patterns = profile['patterns']
+    timestamps = patterns['timestamp']
+
+    def classify(line):
+        events = {}
+        for event, marker, pattern in linePatterns:
+            if marker is None or marker in line:
+                start = timer()
+                match = pattern.search(line)
+                counts = patterns[event]
+                counts[2] += timer() - start
+                counts[0] += 1
+                if match:
+                    counts[1] += 1
+                    events[event] = match
+        return events
+
+    def match_time(line):
+        start = timer()
+        match = timePattern.match(line)
+        timestamps[2] += timer() - start
+        timestamps[0] += 1
+        if match:
+            timestamps[1] += 1
+        return match
+
+    def read_timestamp(text):
+        start = timer()
+        timestamp = parse_timestamp(text)
+        timestamps[2] += timer() - start
+        return timestamp
+
+    return classify, match_time, read_timestamp
+
+def profile_lines(lines, profile):
+    """Yield log lines, timing how long reading them takes and sampling how many have been read"""
+    timer = profile_timer
+    phase_seconds = profile['phases']
+    samples = profile['samples']
+    lines = iter(lines)
+    while True:
+        start = timer()
+        try:
+            line = next(lines)
+        except StopIteration:
+            return
+        now = timer()
+        phase_seconds['ingest'] += now - start
+        profile['lines'] += 1
+        profile['bytes'] += len(line)
+        if now >= profile['next_sample']:
+            samples.append((now - profile['start'], profile['lines'], profile['bytes']))
+            profile['next_sample'] = now + profile_interval
+        yield line
+
+def profile_events(events, profile):
+    """Yield events, counting them by type and timing how long aggregating each one takes"""
+    timer = profile_timer
+    counts = profile['events']
+    for event in events:
+        start = timer()
+        #the consumer aggregates the event before asking for the next one
+        yield event
+        entry = counts[event[0]]
+        entry[1] += timer() - start
+        entry[0] += 1
+
+def iter_events(lines, timestamp=None, sitename=None, profile=None):
+    """Yield the (type, timestamp, site, ip, value) tuple of every scan event in an iterable of log lines, see Event
+
+    Lines are byte strings, as read from a log file opened in binary mode (text is accepted too
+    on Python 3). Besides the scan events, a timestamp event marks each line logged in a new
+    second, a site event each line naming a site, and an asset event each line mentioning an
+    asset other than in an ALIVE or DEAD line, which is what tracks when sites and assets were
+    last logged. timestamp and sitename are the context of the lines before the first timestamp
+    or site name, e.g. when resuming a log part way through. With a profile (see init_profile),
+    the pattern searches and timestamp conversions are timed.
+    """
+    classify, match_time, read_timestamp = classify_line, timePattern.match, parse_timestamp
+    if profile is not None:
+        classify, match_time, read_timestamp = profile_functions(profile)
+    timestamp_text = None
+    for line in text_lines(lines):
+        #route the line to the patterns whose literal markers it contains
+        events = classify(line)
+
+        #timestamps are fixed width, so a line from the same second as the last one is
+        #recognised by its prefix alone; timePattern only runs when the second changes
+        if line[:19] == timestamp_text:
+            log_timestamp = True
+        else:
+            log_timestamp = match_time(line)
+            if log_timestamp:
+                timestamp_text = line[:19]
+                timestamp = read_timestamp(timestamp_text)
+                yield ('timestamp', timestamp, sitename, None, None)
+        if not events:
+            continue
+
+        site_name = events.get('site_name')
+        if site_name:
+            #interned so every asset of a site shares one copy of its name
+            sitename = intern(site_name.group(1))
+            yield ('site', timestamp, sitename, None, None)
+        if 'scan_start' in events:
+            yield ('scan_start', timestamp, sitename, None, None)
+        if 'scan_pause' in events:
+            yield ('scan_pause', timestamp, sitename, None, None)
+        if 'scan_stop' in events:
+            yield ('scan_stop', timestamp, sitename, None, None)
+
+        ip = events.get('ip')
+        if not ip:
+            continue
+        ip = ip.group(1)
+        if 'alive' in events:
+            yield ('alive', timestamp, sitename, ip, None)
+        elif 'dead' in events:
+            yield ('dead', timestamp, sitename, ip, None)
+        else:
+            yield ('asset', timestamp, sitename, ip, None)
+
+        tcp_port = events.get('tcp_port')
+        if tcp_port:
+            yield ('tcp_open', timestamp, sitename, ip, (port_number(tcp_port.group('port')), tcp_port.group('reason')))
+        udp_port = events.get('udp_port')
+        if udp_port:
+            yield ('udp_open', timestamp, sitename, ip, (port_number(udp_port.group('port')), udp_port.group('reason')))
+        #node and spider times are only taken from lines with a timestamp of their own
+        if log_timestamp:
+            if 'node_start' in events:
+                yield ('node_start', timestamp, sitename, ip, None)
+            if 'node_end' in events:
+                yield ('node_end', timestamp, sitename, ip, None)
+            if 'spider_start' in events:
+                yield ('spider_start', timestamp, sitename, ip, None)
+            if 'spider_end' in events:
+                yield ('spider_end', timestamp, sitename, ip, None)
+            spider_summary = events.get('spider_summary')
+            if spider_summary:
+                yield ('spider_summary', timestamp, sitename, ip, intern(spider_summary.group('urls')))
+        if 'vuln' in events:
+            yield ('vuln', timestamp, sitename, ip, None)
+        system_fingerprint = events.get('system_fingerprint')
+        if system_fingerprint:
+            yield ('fingerprint', timestamp, sitename, ip, intern(system_fingerprint.group('certainty')))
+
+def add_asset(state, key, site, timestamp):
+    """Create the record of an asset first logged at a timestamp, listed under its site"""
+    asset = state['assetdata'][key] = Asset(site, timestamp)
+    state['asset_order'].append(key)
+    if site in state['sitedata']:
+        state['sitedata'][site]['assets'].append(key)
+    return asset
+
+def aggregate_events(events, state, verbose_output=no_output, stream=None):
+    """Update the parser state with an iterable of events from iter_events
+
+    Each event applies to the asset of its own IP, whose record is created by the first event
+    other than a dead one that names it. Events for an asset already streamed out are stray,
+    and are counted in state['stray'] instead of giving it a second, incomplete record. With a
+    stream (see init_stream), completed assets are streamed out and evicted as the events are
+    aggregated.
+    """
+    sitedata = state['sitedata']
+    assetdata = state['assetdata']
+    site_order = state['site_order']
+    dead_seen = state['dead_seen']
+    pending = state['pending']
+    pending_dead = state['pending_dead']
+    streamed = state['streamed']
+    streamed_order = state['streamed_order']
+    timestamp = state['timestamp']
+    sitename = state['sitename']
+    last_ip = key = asset = None
+    #verbose messages are only formatted when they are output
+    verbose = verbose_output is not no_output
+    for kind, timestamp, sitename, ip, value in events:
+        if ip is not None:
+            if ip != last_ip:
+                last_ip = ip
+                key = ip_key(ip)
+                asset = assetdata.get(key)
+            if asset is None:
+                if key in streamed:
+                    #counted once per line, by the asset, alive or dead event every line naming an asset has
+                    if kind in ('asset', 'alive', 'dead'):
+                        state['stray'] += 1
+                        if verbose:
+                            verbose_output(sitename, 'Asset {0} logged after it was streamed out, line ignored'.format(ip), timestamp)
+                    continue
+                if kind != 'dead':
+                    asset = add_asset(state, key, sitename, timestamp)
+                    if kind != 'alive' and verbose:
+                        verbose_output(sitename, 'Asset {0} found in log before ALIVE status'.format(ip), timestamp)
+
+        if kind == 'asset':
+            asset.last_timestamp = timestamp
+
+        elif kind == 'site':
+            if sitename in sitedata:
+                sitedata[sitename]['last_timestamp'] = timestamp
+            else:
+                sitedata[sitename] = init_site(timestamp)
+                site_order.append(sitename)
+                if verbose:
+                    verbose_output(sitename, 'found in log', timestamp)
+
+        elif kind == 'timestamp':
+            if (pending and pending[0][0] < timestamp - stream['grace']) or (pending_dead and pending_dead[0][0] < timestamp - stream['grace']):
+                stream_completed(state, stream, timestamp - stream['grace'])
+                #the record of the last asset may have been evicted, so look it up again
+                last_ip = None
+            if streamed_order and streamed_order[0][0] < timestamp - stream['memory']:
+                forget_streamed(state, timestamp - stream['memory'])
+
+        elif kind == 'alive':
+            asset.last_timestamp = timestamp
+            asset.alive = timestamp
+            if verbose:
+                verbose_output(sitename, 'Asset {0} found ALIVE'.format(ip), timestamp)
+
+        elif kind == 'dead':
+            if asset is not None:
+                asset.last_timestamp = timestamp
+                if stream is None:
+                    sitedata[sitename]['dead_ips'].append(key)
+            elif stream is not None:
+                #counted once it waits out the grace window, instead of listing every dead IP
+                pending_dead.append((timestamp, key, sitename))
+            else:
+                dead_seen[key] = timestamp
+                sitedata[sitename]['dead_ips'].append(key)
+            if verbose:
+                verbose_output(sitename, 'Asset {0} found DEAD'.format(ip), timestamp)
+
+        elif kind == 'tcp_open':
+            port, reason = value
+            asset.values.append(port)
+            if not asset.tcptime:
+                asset.tcptime = timestamp
+            if verbose:
+                verbose_output(sitename, 'Asset {0} found open TCP port {1} reason: {2}'.format(ip, port, reason), timestamp)
+
+        elif kind == 'udp_open':
+            port, reason = value
+            asset.values.append(port + udp_port_flag)
+            if not asset.udptime:
+                asset.udptime = timestamp
+            if verbose:
+                verbose_output(sitename, 'Asset {0} found open UDP port {1} reason: {2}'.format(ip, port, reason), timestamp)
+
+        elif kind == 'node_start':
+            asset.nodestart = timestamp
+            if verbose:
+                verbose_output(sitename, 'Asset {0} node scan started'.format(ip), timestamp)
+
+        elif kind == 'node_end':
+            asset.nodeend = timestamp
+            if stream is not None:
+                pending.append((timestamp, key))
+            if verbose:
+                verbose_output(sitename, 'Asset {0} node scan ended'.format(ip), timestamp)
+
+        elif kind == 'spider_start':
+            if not asset.spiderstart:
+                asset.spiderstart = timestamp
+                if verbose:
+                    verbose_output(sitename, 'Asset {0} web spider started'.format(ip), timestamp)
+
+        elif kind == 'spider_end':
+            asset.spiderend = timestamp
+            if verbose:
+                verbose_output(sitename, 'Asset {0} web spider ended'.format(ip), timestamp)
+
+        elif kind == 'spider_summary':
+            if not asset.urls or asset.urls < value:
+                asset.urls = value
+
+        elif kind == 'vuln':
+            asset.vulns += 1
+
+        elif kind == 'fingerprint':
+            asset.fingerprint_certainty = value
+            if verbose:
+                verbose_output(sitename, 'Asset {0} fingerprint certainty: {1}'.format(ip, value), timestamp)
+
+        elif kind in ('scan_start', 'scan_pause', 'scan_stop'):
+            if verbose:
+                verbose_output(sitename, {'scan_start':'scan STARTED', 'scan_pause':'scan PAUSED', 'scan_stop':'scan STOPPED'}[kind], timestamp)
+            if sitename not in sitedata:
+                sitedata[sitename] = init_site(timestamp)
+                site_order.append(sitename)
+            sitedata[sitename][kind].append(timestamp)
+            if kind == 'scan_stop':
+                sitedata[sitename]['completed'] = 'Yes'
+
+    state['timestamp'] = timestamp
+    state['sitename'] = sitename
+    return state
+
+def parse_lines(lines, state, verbose_output=no_output, stream=None, profile=None):
+    """Update the parser state with the events found in an iterable of log lines
+
+    With a stream (see init_stream), completed assets are streamed out and evicted as the log is parsed.
+    With a profile (see init_profile), each step of the parse is timed.
+    """
+    if profile is None:
+        return aggregate_events(iter_events(lines, state['timestamp'], state['sitename']), state, verbose_output, stream)
+    start = profile_timer()
+    try:
+        events = iter_events(profile_lines(lines, profile), state['timestamp'], state['sitename'], profile)
+        return aggregate_events(profile_events(events, profile), state, verbose_output, stream)
+    finally:
+        profile['parse'] += profile_timer() - start
+
+def map_log(f):
+    """Memory-map an open log file read-only, or return None when it cannot be mapped
+
+    Only the scattered lines of index queries are read through a map, where seeking it is about
+    twice as fast as seeking a file buffer. Logs read from start to end are read through a file
+    buffer, which is as fast and does not leave every page read counted in the memory of the process.
+    """
+    try:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (ValueError, EnvironmentError, OverflowError):
+        #empty files, pipes and logs larger than the address space are read normally
+        return None
+
+def read_lines(filename, start=0, end=None):
+    """Yield the lines of a log that begin within the byte range start to end (default: EOF)"""
+    #open file as read-only, and binary mode due to Windows bug with special chars
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        if end is None:
+            for line in f:
+                yield line
+            return
+        position = start
+        for line in f:
+            if position >= end:
+                break
+            position += len(line)
+            yield line
+
+def chunk_ranges(filename, chunks):
+    """Split a log into up to chunks byte ranges for parallel parsing
+
+    Every range starts on a line carrying both a timestamp and a site name, so a
+    worker starting there has the same line context the serial parser would have.
+    """
+    size = os.path.getsize(filename)
+    offsets = [0]
+    with open(filename, 'rb') as f:
+        for chunk in range(1, chunks):
+            offset = max(size * chunk // chunks, offsets[-1])
+            f.seek(offset)
+            #skip the (possibly partial) line the offset landed in
+            offset += len(f.readline())
+            for line in text_lines(iter(f.readline, b'')):
+                if timePattern.match(line) and sitePattern.search(line):
+                    break
+                offset += len(line)
+            if offset >= size:
+                break
+            if offset > offsets[-1]:
+                offsets.append(offset)
+    offsets.append(size)
+    return [(filename, start, end) for start, end in izip(offsets, offsets[1:])]
+
+def parse_chunk(chunk):
+    """Parse one byte range of a log in a worker process and return its partial state"""
+    filename, start, end = chunk
+    return parse_lines(read_lines(filename, start, end), init_state())
+
+def merge_asset(asset, part):
+    """Fold the record of an asset from a later chunk into its earlier record"""
+    #values overwritten on every matching line: the later chunk wins
+    for key in ('alive', 'nodestart', 'nodeend', 'spiderend', 'fingerprint_certainty'):
+        if getattr(part, key):
+            setattr(asset, key, getattr(part, key))
+    #values only set on the first matching line: the earlier chunk wins
+    for key in ('tcptime', 'udptime', 'spiderstart'):
+        if not getattr(asset, key):
+            setattr(asset, key, getattr(part, key))
+    asset.values.extend(part.values[port_index:])
+    if part.urls != 0 and (not asset.urls or asset.urls < part.urls):
+        asset.urls = part.urls
+    asset.vulns += part.vulns
+    asset.last_timestamp = part.last_timestamp
+
+def merge_site(site, part):
+    """Fold the record of a site from a later chunk into its earlier record"""
+    for key in ('scan_start', 'scan_pause', 'scan_stop', 'dead_ips'):
+        site[key].extend(part[key])
+    if part['completed'] == 'Yes':
+        site['completed'] = 'Yes'
+    merge_totals(site['totals'], part['totals'])
+    site['last_timestamp'] = part['last_timestamp']
+
+def merge_chunks(parts):
+    """Merge partial parser states, given in log order, into the state of the whole log"""
+    parts = iter(parts)
+    state = next(parts)
+    sitedata = state['sitedata']
+    assetdata = state['assetdata']
+    for part in parts:
+        for site in part['site_order']:
+            if site in sitedata:
+                merge_site(sitedata[site], part['sitedata'][site])
+            else:
+                sitedata[site] = part['sitedata'][site]
+                #rebuilt below: assets already seen in an earlier chunk stay under the site they were first seen with
+                sitedata[site]['assets'] = []
+                state['site_order'].append(site)
+        for ip in part['asset_order']:
+            if ip in assetdata:
+                merge_asset(assetdata[ip], part['assetdata'][ip])
+            else:
+                record = assetdata[ip] = part['assetdata'][ip]
+                state['asset_order'].append(ip)
+                if record.sitename in sitedata:
+                    sitedata[record.sitename]['assets'].append(ip)
+        for ip, timestamp in part['dead_seen'].items():
+            if ip in part['assetdata']:
+                continue
+            if ip in assetdata:
+                assetdata[ip].last_timestamp = timestamp
+            else:
+                state['dead_seen'][ip] = timestamp
+        if part['timestamp'] is not None:
+            state['timestamp'] = part['timestamp']
+        if part['sitename'] is not None:
+            state['sitename'] = part['sitename']
+    return state
+
+def first_logged(record):
+    """Return the timestamp of the first scan event of an asset, or its last timestamp if it has none"""
+    events = [timestamp for timestamp in (record.alive, record.tcptime, record.udptime, record.nodestart, record.spiderstart) if timestamp]
+    return min(events) if events else record.last_timestamp or 0
+
+def union_ports(first, second):
+    """Combine two port arrays, keeping the order of first and adding the ports only found in second"""
+    seen = set(first)
+    return first + array('H', (port for port in second if port not in seen))
+
+def reconcile_asset(asset, part):
+    """Fold the record of an asset logged by another engine (e.g. after a failover) into its record
+
+    The engine that logged the asset first is treated as the earlier chunk of one log. Ports are
+    combined without repeats and vulnerabilities are counted once, as both engines may have found them.
+    """
+    tcpportlist = union_ports(asset.tcpportlist, part.tcpportlist)
+    udpportlist = union_ports(asset.udpportlist, part.udpportlist)
+    vulns = max(asset.vulns, part.vulns)
+    if first_logged(part) < first_logged(asset):
+        #keep the site the asset was first listed under
+        sitename = asset.sitename
+        merge_asset(part, asset)
+        asset.__setstate__(part.__getstate__())
+        asset.sitename = sitename
+    else:
+        merge_asset(asset, part)
+    asset.set_ports(tcpportlist, udpportlist)
+    asset.vulns = vulns
+
+def reconcile_site(site, part):
+    """Fold the record of a site logged by another engine into its record, keeping its scan events in time order"""
+    #sites named before the first timestamped line have no timestamp
+    first = min(site['first_timestamp'] or 0, part['first_timestamp'] or 0)
+    last = max(site['last_timestamp'] or 0, part['last_timestamp'] or 0)
+    merge_site(site, part)
+    for key in ('scan_start', 'scan_pause', 'scan_stop'):
+        site[key].sort()
+    site['first_timestamp'] = first
+    site['last_timestamp'] = last
+
+def merge_engines(parts, names):
+    """Merge the parser states of several scan engines into one, tagging sites and assets with the engines that logged them"""
+    state = init_state()
+    sitedata = state['sitedata']
+    assetdata = state['assetdata']
+    site_engines = state['site_engines']
+    asset_engines = state['asset_engines']
+    for name, part in izip(names, parts):
+        for site in part['site_order']:
+            site_engines.setdefault(site, []).append(name)
+            if site in sitedata:
+                reconcile_site(sitedata[site], part['sitedata'][site])
+            else:
+                sitedata[site] = part['sitedata'][site]
+                #rebuilt below, as for chunks of one log
+                sitedata[site]['assets'] = []
+                state['site_order'].append(site)
+        for ip in part['asset_order']:
+            if ip in assetdata:
+                reconcile_asset(assetdata[ip], part['assetdata'][ip])
+                asset_engines[ip] += ', ' + name
+            else:
+                record = assetdata[ip] = part['assetdata'][ip]
+                asset_engines[ip] = name
+                state['asset_order'].append(ip)
+                if record.sitename in sitedata:
+                    sitedata[record.sitename]['assets'].append(ip)
+        for ip, timestamp in part['dead_seen'].items():
+            if ip in part['assetdata']:
+                continue
+            if ip in assetdata:
+                assetdata[ip].last_timestamp = max(assetdata[ip].last_timestamp, timestamp)
+            else:
+                state['dead_seen'][ip] = max(state['dead_seen'].get(ip, timestamp), timestamp)
+    return state
+
+def init_checkpoint():
+    """Create dictionary for a parser checkpoint: the state plus the log position it covers"""
+    checkpoint_dict = {'version':checkpoint_version, 'python':sys.version_info[0], 'device':None, 'inode':None, 'offset':0, 'state':init_state()}
+    return checkpoint_dict
+
+def load_checkpoint(path):
+    """Load a saved checkpoint, or start a new one if there is none or it is from another version"""
+    try:
+        with open(path, 'rb') as f:
+            checkpoint = pickle.load(f)
+    except IOError:
+        return init_checkpoint()
+    except Exception:
+        #e.g. a checkpoint pickled by Python 3 read by Python 2
+        checkpoint = None
+    #checkpoints hold the log's strings as bytes on Python 2 and as text on Python 3
+    if not isinstance(checkpoint, dict) or checkpoint.get('version') != checkpoint_version or checkpoint.get('python') != sys.version_info[0]:
+        print('Ignoring checkpoint {0}: written by another version of logtime or Python'.format(path))
+        return init_checkpoint()
+    return checkpoint
+
+def save_checkpoint(path, checkpoint):
+    """Write a checkpoint to path, replacing any previous one only once it is complete"""
+    temp = path + '.tmp'
+    with open(temp, 'wb') as f:
+        pickle.dump(checkpoint, f, pickle.HIGHEST_PROTOCOL)
+    if os.name == 'nt' and os.path.exists(path):
+        os.remove(path)
+    os.rename(temp, path)
+
+def find_rotated_log(filename, device, inode):
+    """Find the file a rotated log was renamed to by looking for its inode next to the log"""
+    directory = os.path.dirname(os.path.abspath(filename))
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        if (st.st_dev, st.st_ino) == (device, inode):
+            return path
+    return None
+
+def log_replaced(filename, checkpoint):
+    """Check whether the log at filename is no longer the file the checkpoint is reading"""
+    try:
+        st = os.stat(filename)
+    except OSError:
+        #the log has been moved away and not recreated yet
+        return False
+    return (st.st_dev, st.st_ino) != (checkpoint['device'], checkpoint['inode']) or st.st_size < checkpoint['offset']
+
+def open_checkpointed_log(filename, checkpoint):
+    """Open a log positioned where the checkpoint left off, detecting rotation and truncation
+
+    If the log was rotated (it is a different file now) or truncated (it is shorter than
+    the checkpoint offset), the accumulated state is kept and reading restarts at the
+    beginning of the current file. Returns the open log and, for a rotation, the path
+    and offset of the rotated file if it can still be found, so its unread tail can be
+    parsed first.
+    """
+    f = open(filename, 'rb')
+    st = os.fstat(f.fileno())
+    rotated = None
+    if checkpoint['inode'] is not None:
+        if (st.st_dev, st.st_ino) != (checkpoint['device'], checkpoint['inode']):
+            path = find_rotated_log(filename, checkpoint['device'], checkpoint['inode'])
+            if path:
+                rotated = (path, checkpoint['offset'])
+            print('Log {0} was rotated, reading it from the start'.format(filename))
+        elif st.st_size < checkpoint['offset']:
+            print('Log {0} was truncated, reading it from the start'.format(filename))
+        else:
+            f.seek(checkpoint['offset'])
+            return f, None
+    checkpoint['device'] = st.st_dev
+    checkpoint['inode'] = st.st_ino
+    checkpoint['offset'] = 0
+    return f, rotated
+
+def read_appended_lines(f, checkpoint):
+    """Yield the complete lines available in an open log, advancing the checkpoint offset"""
+    for line in iter(f.readline, b''):
+        if not line.endswith(b'\n'):
+            #the line is still being written, leave it for the next read
+            f.seek(checkpoint['offset'])
+            break
+        checkpoint['offset'] += len(line)
+        yield line
+
+def open_index(path):
+    """Open the SQLite index of a log, creating it, or recreating it if it is from another version"""
+    db = sqlite3.connect(path)
+    #site names are kept as the byte strings found in the log
+    db.text_factory = str
+    try:
+        version = db.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+    except sqlite3.OperationalError:
+        version = None
+    if version != (index_version,):
+        for table in ('meta', 'lines', 'sites', 'ips'):
+            db.execute('DROP TABLE IF EXISTS ' + table)
+        db.executescript(index_schema)
+        db.execute("INSERT INTO meta VALUES ('version', ?)", (index_version,))
+        db.commit()
+    return db
+
+def index_events(lines, checkpoint, context, sites, ips):
+    """Yield an index row for every line with a scan event, noting the first and last lines of sites and IPs
+
+    context carries the timestamp and site of the last line over to the next update.
+    """
+    timestamp = context['timestamp']
+    timestamp_text = None
+    sitename = context['sitename']
+    for line in lines:
+        offset = checkpoint['offset'] - len(line)
+        events = classify_line(line)
+        if line[:19] != timestamp_text and timePattern.match(line):
+            timestamp_text = line[:19]
+            timestamp = parse_timestamp(timestamp_text)
+
+        site_name = events.pop('site_name', None)
+        if site_name:
+            sitename = site_name.group(1)
+            if sitename in sites:
+                sites[sitename][2:] = offset, timestamp
+            else:
+                sites[sitename] = [offset, timestamp, offset, timestamp]
+
+        ip = events.pop('ip', None)
+        if ip:
+            ip = ip.group(1)
+            if ip in ips:
+                ips[ip][3:] = offset, sitename, timestamp
+            else:
+                ips[ip] = [sitename, offset, timestamp, offset, sitename, timestamp]
+
+        if events:
+            yield offset, timestamp, sitename, ip, ','.join(sorted(events))
+    context['timestamp'] = timestamp
+    context['sitename'] = sitename
+
+def update_index(db, filename):
+    """Index the lines appended to a log since its index was last updated, returning how many were indexed"""
+    meta = dict(db.execute('SELECT key, value FROM meta'))
+    checkpoint = {'device':meta.get('device'), 'inode':meta.get('inode'), 'offset':meta.get('offset', 0)}
+    context = {'timestamp':meta.get('timestamp'), 'sitename':meta.get('sitename')}
+    f, rotated = open_checkpointed_log(filename, checkpoint)
+    with f:
+        if checkpoint['offset'] == 0:
+            #a new, rotated or truncated log: offsets into what was indexed before are meaningless
+            for table in ('lines', 'sites', 'ips'):
+                db.execute('DELETE FROM ' + table)
+            context = {'timestamp':None, 'sitename':None}
+        start = checkpoint['offset']
+        sites = {}
+        ips = {}
+        db.executemany('INSERT INTO lines VALUES (?, ?, ?, ?, ?)', index_events(text_lines(read_appended_lines(f, checkpoint)), checkpoint, context, sites, ips))
+    for site, (first_offset, first_timestamp, last_offset, last_timestamp) in sites.items():
+        db.execute('INSERT OR IGNORE INTO sites VALUES (?, ?, ?, ?, ?)', (site, first_offset, first_timestamp, last_offset, last_timestamp))
+        db.execute('UPDATE sites SET last_offset = ?, last_timestamp = ? WHERE site = ?', (last_offset, last_timestamp, site))
+    for ip, (site, first_offset, first_timestamp, last_offset, last_site, last_timestamp) in ips.items():
+        db.execute('INSERT OR IGNORE INTO ips VALUES (?, ?, ?, ?, ?, ?, ?)', (ip, site, first_offset, first_timestamp, last_offset, last_site, last_timestamp))
+        db.execute('UPDATE ips SET last_offset = ?, last_site = ?, last_timestamp = ? WHERE ip = ?', (last_offset, last_site, last_timestamp, ip))
+    for key in ('device', 'inode', 'offset'):
+        db.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)', (key, checkpoint[key]))
+    for key in ('timestamp', 'sitename'):
+        db.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)', (key, context[key]))
+    db.commit()
+    return checkpoint['offset'] - start
+
+def index_contexts(db, site=None, ip=None):
+    """Return the (offset, site, timestamp) of every log line needed to report on a site or an IP, in log order"""
+    if ip is not None:
+        #the lines of the IP, and the scan events of the site it belongs to
+        site = (db.execute('SELECT site FROM ips WHERE ip = ?', (ip,)).fetchone() or (None,))[0]
+        queries = [('SELECT offset, site, timestamp FROM lines WHERE ip = ?', ip),
+                   ('SELECT offset, site, timestamp FROM lines WHERE site = ? AND ip IS NULL', site),
+                   ('SELECT first_offset, site, first_timestamp FROM ips WHERE ip = ?', ip),
+                   ('SELECT last_offset, last_site, last_timestamp FROM ips WHERE ip = ?', ip)]
+    else:
+        queries = [('SELECT offset, site, timestamp FROM lines WHERE site = ?', site),
+                   ('SELECT first_offset, site, first_timestamp FROM ips WHERE site = ?', site),
+                   ('SELECT last_offset, last_site, last_timestamp FROM ips WHERE site = ?', site)]
+    queries += [('SELECT first_offset, site, first_timestamp FROM sites WHERE site = ?', site),
+                ('SELECT last_offset, site, last_timestamp FROM sites WHERE site = ?', site)]
+    contexts = {}
+    for query, value in queries:
+        for offset, sitename, timestamp in db.execute(query, (value,)):
+            contexts[offset] = (offset, sitename, timestamp)
+    return sorted(contexts.values())
+
+def ip_timeline(db, ip):
+    """Return the (timestamp, site, events) of every line of an IP with a scan event, in log order"""
+    return db.execute('SELECT timestamp, site, events FROM lines WHERE ip = ? ORDER BY offset', (ip,)).fetchall()
+
+def read_offsets(buf, contexts):
+    """Yield the lines of an open (or memory-mapped) log at the offsets of (offset, site, timestamp) contexts"""
+    for offset, sitename, timestamp in contexts:
+        buf.seek(offset)
+        yield buf.readline()
+
+def parse_indexed_lines(filename, contexts, state, verbose_output=no_output, profile=None):
+    """Parse only the log lines at the given (offset, site, timestamp) contexts into the parser state
+
+    Each run of lines is parsed with the site and timestamp it had in the whole log,
+    so lines without their own site name or timestamp are attributed as they would be.
+    """
+    with open(filename, 'rb') as f:
+        buf = map_log(f) or f
+        try:
+            for (sitename, timestamp), run in groupby(contexts, lambda context: context[1:]):
+                state['sitename'] = sitename
+                state['timestamp'] = timestamp
+                parse_lines(read_offsets(buf, run), state, verbose_output, profile=profile)
+        finally:
+            if buf is not f:
+                buf.close()
+    return state
+
+def sample_digest(path):
+    """Hash evenly spaced samples of a file, so a changed file is noticed without reading all of it"""
+    digest = hashlib.sha1()
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        for sample in range(cache_samples):
+            f.seek(max(size - cache_sample_size, 0) * sample // (cache_samples - 1))
+            digest.update(f.read(cache_sample_size))
+    return digest.hexdigest()
+
+def cache_key(logs):
+    """Key the parse result of (path, member) inputs by the parser version and the size, mtime and samples of each log"""
+    digest = hashlib.sha1()
+    digest.update(repr((cache_version, checkpoint_version, sys.version_info[0], timePattern.pattern, [(event, pattern.pattern) for event, marker, pattern in linePatterns])).encode('utf-8'))
+    for path, member in logs:
+        st = os.stat(path)
+        #the path is left out, so a log that was moved or copied elsewhere still hits the cache
+        digest.update(repr((member, st.st_size, st.st_mtime, sample_digest(path))).encode('utf-8'))
+    return digest.hexdigest()
+
+def pack_state(state):
+    """Serialize a parser state compactly, storing the asset records column by column
+
+    The arrays of values of the assets are concatenated into one raw array, with the length of
+    each, which load far faster than pickling every record as an object.
+    """
+    assetdata = state['assetdata']
+    keys = list(assetdata)
+    records = [assetdata[key] for key in keys]
+    columns = {}
+    for field in cache_string_fields:
+        columns[field] = [getattr(record, field) for record in records]
+    lengths = array('l')
+    values = array(asset_values.typecode)
+    for record in records:
+        lengths.append(len(record.values))
+        values.extend(record.values)
+    columns['values'] = (array_tobytes(lengths), array_tobytes(values))
+    packed = dict(state)
+    packed['assetdata'] = None
+    return zlib.compress(pickle.dumps({'state':packed, 'keys':keys, 'columns':columns}, pickle.HIGHEST_PROTOCOL), 1)
+
+def unpack_values(lengths, values):
+    """Yield the array of values of each asset from the packed values column"""
+    offset = 0
+    for length in lengths:
+        yield values[offset:offset + length]
+        offset += length
+
+def unpack_state(data):
+    """Rebuild a parser state serialized by pack_state"""
+    packed = pickle.loads(zlib.decompress(data))
+    columns = packed['columns']
+    lengths = array('l')
+    array_frombytes(lengths, columns['values'][0])
+    values = array(asset_values.typecode)
+    array_frombytes(values, columns['values'][1])
+    state = packed['state']
+    assetdata = state['assetdata'] = {}
+    new_asset = Asset.__new__
+    for key, sitename, record_values, urls, certainty in izip(packed['keys'], columns['sitename'], unpack_values(lengths, values), columns['urls'], columns['fingerprint_certainty']):
+        asset = assetdata[key] = new_asset(Asset)
+        asset.__setstate__((sitename, record_values, urls, certainty))
+    return state
+
+def read_cache(directory, key):
+    """Read a cache entry packed by pack_state, or return None if there is none"""
+    path = os.path.join(directory, key + '.cache')
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except IOError:
+        return None
+    #the modification time orders entries by last use for eviction
+    os.utime(path, None)
+    return data
+
+def load_cache(directory, key):
+    """Load a cached parser state, or return None if there is none"""
+    data = read_cache(directory, key)
+    if data is None:
+        return None
+    try:
+        return unpack_state(data)
+    except Exception as e:
+        print('Ignoring unreadable cache entry {0}: {1}'.format(os.path.join(directory, key + '.cache'), e))
+        return None
+
+def save_cache(directory, key, data, limit):
+    """Cache a parser state packed by pack_state, then evict the least recently used entries beyond limit bytes"""
+    path = os.path.join(directory, key + '.cache')
+    temp = path + '.tmp'
+    try:
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(temp, 'wb') as f:
+            f.write(data)
+        if os.name == 'nt' and os.path.exists(path):
+            os.remove(path)
+        os.rename(temp, path)
+        entries = []
+        for entry in glob.glob(os.path.join(directory, '*.cache')):
+            st = os.stat(entry)
+            entries.append((st.st_mtime, st.st_size, entry))
+        entries.sort()
+        total = sum(size for mtime, size, entry in entries)
+        for mtime, size, entry in entries:
+            if total <= limit or entry == path:
+                break
+            try:
+                os.remove(entry)
+            except OSError:
+                #already evicted by another process saving at the same time
+                pass
+            total -= size
+    except EnvironmentError as e:
+        print('Not caching the parse result: {0}'.format(e))
+
+def compression_type(path):
+    """Return the compression extension of a log file name, or '' for a plain log"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in compressed_extensions:
+        return extension
+    return ''
+
+def rotation_key(path):
+    """Sort key putting rotated logs oldest first: nse.log.2.gz, nse.log.1.gz, nse.log"""
+    name = path[:len(path) - len(compression_type(path))]
+    base, suffix = os.path.splitext(name)
+    if suffix[1:].isdigit():
+        return (base, -int(suffix[1:]))
+    return (name, 0)
+
+def expand_inputs(args):
+    """Expand globs in the input arguments into the list of logs to parse, in rotation order
+
+    Each log is a (path, member) pair, where member names a file inside a ZIP archive,
+    so the logs bundled in a scan log export are parsed like separate rotated files.
+    """
+    paths = []
+    for arg in args:
+        if os.path.isdir(arg):
+            paths.extend(find_logs(arg))
+            continue
+        #Windows shells leave wildcards for the program to expand; "nse.log*" should not pick up the log index
+        paths.extend(sorted(path for path in glob.glob(arg) if not path.endswith('.index')) or [arg])
+    logs = []
+    for path in sorted(paths, key=rotation_key):
+        if compression_type(path) == '.zip':
+            with zipfile.ZipFile(path) as archive:
+                members = [info.filename for info in archive.infolist() if not info.filename.endswith('/')]
+            logs.extend((path, member) for member in sorted(members, key=rotation_key))
+        else:
+            logs.append((path, None))
+    return logs
+
+def find_logs(directory):
+    """List the logs and ZIP log exports under a directory, e.g. one subdirectory per scan engine"""
+    found = []
+    for root, dirs, files in os.walk(directory):
+        for name in files:
+            if compression_type(name) == '.zip' or os.path.splitext(rotation_key(name)[0])[1] == '.log':
+                found.append(os.path.join(root, name))
+    return sorted(found)
+
+def log_engine(log):
+    """Return the name of the engine log a (path, member) input belongs to: its ZIP archive or unrotated log path"""
+    path, member = log
+    if member is not None:
+        return path
+    return rotation_key(path)[0]
+
+def group_engines(logs):
+    """Group (path, member) inputs in rotation order into the logs of each scan engine
+
+    Returns (engine name, logs) pairs. Engines are named by their log path relative to the
+    directory all of them are in, or just by their directory when every engine log has the same name.
+    """
+    groups = [(engine, list(group)) for engine, group in groupby(logs, log_engine)]
+    paths = [os.path.abspath(engine) for engine, group in groups]
+    common = os.path.dirname(os.path.commonprefix(paths))
+    names = [os.path.relpath(path, common) for path in paths]
+    if len(set(os.path.basename(name) for name in names)) == 1 and all(os.path.dirname(name) for name in names):
+        names = [os.path.dirname(name) for name in names]
+    return [(name, group) for name, (engine, group) in izip(names, groups)]
+
+def read_blocks(log):
+    """Yield the decompressed data of a log in blocks, decompressing gzip, bz2, xz and ZIP members"""
+    path, member = log
+    if member is not None:
+        with zipfile.ZipFile(path) as archive:
+            f = archive.open(member)
+            for block in iter(lambda: f.read(block_size), b''):
+                yield block
+        return
+    compression = compression_type(path)
+    if compression and compression not in decompressors:
+        raise IOError('Reading {0} needs the lzma module (backports.lzma on Python 2)'.format(path))
+    with open(path, 'rb') as f:
+        if not compression:
+            for block in iter(lambda: f.read(block_size), b''):
+                yield block
+            return
+        decompressor = decompressors[compression]()
+        for block in iter(lambda: f.read(compressed_block_size), b''):
+            while block:
+                yield decompressor.decompress(block)
+                block = decompressor.unused_data
+                if block:
+                    #concatenated streams (e.g. appended gzip members) need a new decompressor
+                    decompressor = decompressors[compression]()
+        if hasattr(decompressor, 'flush'):
+            yield decompressor.flush()
+
+def prefetch_blocks(log, queue):
+    """Decompress a log into a queue from a background thread, ending with None or the error raised"""
+    try:
+        for block in read_blocks(log):
+            if block:
+                queue.put(block)
+        queue.put(None)
+    except Exception as e:
+        queue.put(e)
+
+def read_inputs(logs, threads=1):
+    """Yield the lines of several (possibly compressed) logs in order, as one stream
+
+    Up to threads logs are decompressed ahead in background threads while the lines of
+    the current one are parsed; zlib, bz2 and lzma release the GIL while they work.
+    """
+    logs = iter(logs)
+    pending = deque(start_prefetch(log) for log in islice(logs, max(threads, 1)))
+    while pending:
+        queue = pending.popleft()
+        for log in islice(logs, 1):
+            pending.append(start_prefetch(log))
+        partial = b''
+        #waiting with a timeout keeps the wait interruptible by Ctrl-C on Python 2
+        for block in iter(lambda: queue.get(True, prefetch_timeout), None):
+            if isinstance(block, Exception):
+                raise block
+            lines = (partial + block).split(b'\n')
+            partial = lines.pop()
+            for line in lines:
+                yield line + b'\n'
+        if partial:
+            yield partial
+
+def start_prefetch(log):
+    """Start decompressing a log in a daemon thread, returning the queue its blocks arrive on"""
+    queue = Queue(prefetch_blocks_ahead)
+    thread = threading.Thread(target=prefetch_blocks, args=(log, queue))
+    thread.daemon = True
+    thread.start()
+    return queue
+
+def parse_engine(task):
+    """Parse the logs of one scan engine in a worker process and return its state packed by pack_state
+
+    Packed states pass back to the main process several times faster than pickled asset
+    records. With a cache directory, the packed state is read from and saved to the engine's
+    own cache entry, so only the engines whose logs changed are parsed again.
+    """
+    logs, cachedir, cachesize = task
+    data = None
+    if cachedir:
+        key = cache_key(logs)
+        data = read_cache(cachedir, key)
+    if data is None:
+        path, member = logs[0]
+        if len(logs) == 1 and member is None and not compression_type(path):
+            state = parse_lines(read_lines(path), init_state())
+        else:
+            state = parse_lines(read_inputs(logs), init_state())
+        data = pack_state(state)
+        if cachedir:
+            save_cache(cachedir, key, data, cachesize)
+    return data
+
+def scan_duration(site):
+    """Total up the scan time of a site, pairing each start with the pause after it and the last start with the stop"""
+    #durations are recomputed from the parsed events on every report, so the
+    #state can keep being updated and reported on (see --follow)
+    site['scan_durations'] = []
+    starts = len(site['scan_start'])
+    if not starts:
+        #a log that starts part way through a scan, or whose start line was rotated away, has no start
+        site['scan_total_duration'] = 'Unknown'
+        return 'Unknown'
+    pauses = len(site['scan_pause'])
+    stops = len(site['scan_stop'])
+
+    if pauses >= 1:
+        if starts >= pauses:
+            for start, pause in izip(site['scan_start'], site['scan_pause']):
+                site['scan_durations'].append(calc_duration(start, pause))                    
+
+    scan_stop = site['scan_stop']
+    if stops <= 0:
+        scan_stop = [site['last_timestamp']]
+
+    site['scan_durations'].append(calc_duration(site['scan_start'][starts - 1], scan_stop[stops - 1]))
+
+    total = sum(site['scan_durations'])
+
+    site['scan_total_duration'] = total
+    return total
+
+def site_totals(state, site, top, csvwriter=None):
+    """Total up the assets of a site, writing the CSV rows of those still in memory
+
+    Returns the running totals and the number of assets logged for the site.
+    """
+    sitedata = state['sitedata']
+    assetdata = state['assetdata']
+    asset_engines = state['asset_engines']
+    #start from the totals of the assets already streamed out, then add those still in memory
+    totals = init_totals()
+    merge_totals(totals, sitedata[site]['totals'], top)
+    #assets streamed out are in the site totals already, even if also logged DEAD
+    logged = set(sitedata[site]['dead_ips']).difference(state['streamed'])
+
+    #each asset is visited once, under the site it was first seen with
+    for asset in sitedata[site]['assets']:
+        record = assetdata.get(asset)
+        if record is None:
+            #streamed out and evicted, and already in the site totals
+            continue
+        logged.add(asset)
+        durations = asset_durations(record, sitedata[site])
+        discoverytime, nodetime, spidertime, totaltime = durations
+        fold_asset(totals, asset, record, durations, top)
+
+        #outtext = 'Site: %s | Asset: %s | Open Ports: %s | Discovery Time: %s | Spider Time: %s | Node Time: %s | Total Time: %s' % (record.sitename,format_ip(asset).ljust(15), str(record.tcpports).ljust(5), str(discoverytime).ljust(17), str(spidertime).ljust(17), str(nodetime).ljust(17), str(totaltime))
+
+        if csvwriter:
+            row = asset_row(asset, record, durations)
+            if asset_engines:
+                row += (asset_engines[asset],)
+            csvwriter.writerow(row)
+
+    return totals, sitedata[site]['totals']['assets'] + len(logged)
+
+def find_scan_runs(filename):
+    """Split a log into the scan runs of its sites, returned as (site, run number, byte ranges) in order of starting
+
+    Each byte range is a (start, end, timestamp) triple, timestamp being the log time the range
+    starts at, so it can be parsed with the line context it has in the whole log. A run starts at a "Scan for site" line and ends after the stop line of its site. While a run
+    is paused, the lines up to the next "Scan for site" line of its site (the resume) are left out
+    of its ranges. A run that is never stopped ends where the next run of its site starts, or at
+    the end of the log (an end offset of None).
+    """
+    runs = []
+    open_runs = {}
+    run_counts = {}
+    sitename = timestamp = None
+    offset = 0
+    for line in text_lines(read_lines(filename)):
+        start = offset
+        offset += len(line)
+        if timePattern.match(line):
+            timestamp = parse_timestamp(line[:19])
+        if '[Site: ' in line:
+            site_name = sitePattern.search(line)
+            if site_name:
+                sitename = site_name.group(1)
+        if 'Scan for site' in line and scanStartPattern.search(line):
+            run = open_runs.get(sitename)
+            if run is None or not run['paused']:
+                if run is not None:
+                    #started again without stopping: the previous run ends here
+                    run['ranges'][-1][1] = start
+                run_counts[sitename] = run_counts.get(sitename, 0) + 1
+                run = open_runs[sitename] = {'site':sitename, 'run':run_counts[sitename], 'ranges':[], 'paused':False}
+                runs.append(run)
+            run['ranges'].append([start, None, timestamp])
+            run['paused'] = False
+        elif 'Scan paused' in line and scanPausePattern.search(line):
+            run = open_runs.get(sitename)
+            if run is not None and not run['paused']:
+                run['ranges'][-1][1] = offset
+                run['paused'] = True
+        elif '] Scan ' in line and scanStopPattern.search(line):
+            run = open_runs.pop(sitename, None)
+            if run is not None:
+                if run['paused']:
+                    #stopped while paused: only the stop line itself belongs to the run again
+                    run['ranges'].append([start, offset, timestamp])
+                else:
+                    run['ranges'][-1][1] = offset
+    return [(run['site'], run['run'], [tuple(byte_range) for byte_range in run['ranges']]) for run in runs]
+
+def analyze_run(task):
+    """Parse the byte ranges of one scan run, in a worker process, and return its row of run_headers"""
+    filename, site, run, ranges, top = task
+    state = init_state()
+    for start, end, timestamp in ranges:
+        #lines before the first site name or timestamp of a range belong to the run, as in the whole log
+        state['sitename'] = site
+        state['timestamp'] = timestamp
+        parse_lines(read_lines(filename, start, end), state)
+    #lines of other sites scanned at the same time are parsed too, but only this site is reported
+    record = state['sitedata'][site]
+    total = scan_duration(record)
+    totals, loggedcount = site_totals(state, site, top)
+    stats = dict((phase, duration_stats(totals['durations'][phase], totals['timed'][phase], totals['slowest'][phase])) for phase, title in phases)
+    ended = (record['scan_stop'] or [record['last_timestamp']])[-1]
+    row = [site, run, format_timestamp(record['scan_start'][0]), format_timestamp(ended), record['completed'], str(format_duration(total)), len(record['scan_pause']), loggedcount, totals['alive'], totals['scanned']]
+    if totals['longest']:
+        row += [format_ip(totals['longest'][1]), str(format_duration(totals['longest'][0]))]
+    else:
+        row += ['', '']
+    row += [str(stats[phase]['average']) for phase, title in phases]
+    row += [str(format_duration(value)) for value in stats['total']['percentiles']]
+    return row
+
+def write_runs(rows, csvwriter=None):
+    """Print a line for each scan run and write its CSV row, as the runs are analyzed"""
+    for row in rows:
+        print('[Site: {0}] Run {1}: {2} to {3}, scan time: {5}, completed: {4}, pauses: {6}, assets logged/alive/scanned: {7}/{8}/{9}, average/p90 total time: {15} / {17}'.format(*row))
+        if csvwriter:
+            csvwriter.writerow(row)
+
+def summarize(state, options, csvwriter=None, summarywriter=None):
+    """Calculate scan durations from the parser state, print the site summaries and write the CSV rows"""
+    sitedata = state['sitedata']
+
+    #total up scan durations for each site found in scan log
+    for site in state['site_order']:
+        total = scan_duration(sitedata[site])
+        totals, loggedcount = site_totals(state, site, options.top, csvwriter)
+
+        stats = dict((phase, duration_stats(totals['durations'][phase], totals['timed'][phase], totals['slowest'][phase])) for phase, title in phases)
+
+        print('\nSummary for [Site: %s]' % site)
+        print('Total assets logged: %i' % loggedcount)
+        print('Total assets alive: %i' % (totals['alive']))
+        print('Total assets scanned (complete): %i' % (totals['scanned']))
+        print('Total scan time: %s' % format_duration(total))
+        print('Scan completed: %s' % sitedata[site]['completed'])
+        if state['site_engines']:
+            print('Scan engines: %s' % ', '.join(state['site_engines'][site]))
+        if totals['longest']:
+            print('Most scan time: %s @ %s' % (format_ip(totals['longest'][1]), format_duration(totals['longest'][0])))
+        if totals['shortest']:
+            print('Least scan time: %s @ %s \n' % (format_ip(totals['shortest'][1]), format_duration(totals['shortest'][0])))
+        print('Average discovery time: %s' % stats['discovery']['average'])
+        print('Average node time: %s' % stats['node']['average'])
+        print('Average web spider time: %s' % stats['spider']['average'])
+        for phase, title in phases:
+            if not options.quiet:
+                print('%s time p%s: %s' % (title, '/p'.join(str(point) for point in percentile_points), format_percentiles(stats[phase]['percentiles'])))
+                print('%s time histogram: %s' % (title, format_histogram(stats[phase]['histogram'])))
+                if stats[phase]['slowest']:
+                    print('Slowest %s times: %s' % (title.lower(), format_slowest(stats[phase]['slowest'])))
+
+        if summarywriter:
+            row = [site, loggedcount, totals['alive'], totals['scanned'], str(format_duration(total))]
+            for scan in (totals['longest'], totals['shortest']):
+                if scan:
+                    row += [format_ip(scan[1]), str(format_duration(scan[0]))]
+                else:
+                    row += ['', '']
+            for phase, title in phases:
+                row += [str(stats[phase]['average'])] + [str(format_duration(value)) for value in stats[phase]['percentiles']]
+                row += [format_histogram(stats[phase]['histogram']), format_slowest(stats[phase]['slowest'])]
+            if state['site_engines']:
+                row.append(', '.join(state['site_engines'][site]))
+            summarywriter.writerow(row)
+
+    if state['stray']:
+        print('\nLines ignored as logged after their asset was streamed out (a longer -g keeps them): %i' % state['stray'])
+
+def peak_rss():
+    """Return the peak resident memory of this process in bytes, or None where it is not available"""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #kilobytes on Linux, bytes on macOS
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+def asset_memory(assetdata):
+    """Return the bytes taken by asset records: the records, their arrays of values, their keys and the dictionary holding them
+
+    Site names, URL counts and certainties are interned and shared between assets, so they are left out.
+    """
+    total = sys.getsizeof(assetdata)
+    for key in assetdata:
+        record = assetdata[key]
+        total += sys.getsizeof(key) + sys.getsizeof(record) + sys.getsizeof(record.values)
+    return total
+
+def profile_share(seconds, total):
+    """Return seconds as a percentage of the total seconds"""
+    return round(100.0 * seconds / total, 2) if total else 0.0
+
+def profile_overhead(profile):
+    """Return the seconds the profiling itself added to a parse
+
+    The wrappers timing each line read, pattern search and event are run over empty work on a
+    scratch profile, less the plain loop or search they stand in for, and the cost of each is
+    counted once for every line, search and event of the profile.
+    """
+    timer = profile_timer
+    calls = profile_calibration
+    scratch = init_profile()
+    classify, match_time, read_timestamp = profile_functions(scratch)
+    event = ('timestamp', 0, None, None, None)
+
+    def cost(profiled, plain):
+        start = timer()
+        for item in profiled:
+            pass
+        middle = timer()
+        for item in plain:
+            pass
+        return max((middle - start) - (timer() - middle), 0.0) / calls
+
+    line_cost = cost(profile_lines(repeat(b'', calls), scratch), repeat(b'', calls))
+    search_cost = cost(imap(match_time, repeat('', calls)), imap(timePattern.match, repeat('', calls)))
+    event_cost = cost(profile_events(repeat(event, calls), scratch), repeat(event, calls))
+    patterns = profile['patterns']
+    searches = sum(counts[0] for counts in patterns.values()) + patterns['timestamp'][1]
+    return profile['lines'] * line_cost + searches * search_cost + sum(counts[0] for counts in profile['events'].values()) * event_cost
+
+def profile_report(profile, state):
+    """Build the report of a profiled run and the parser state it left, as nested dictionaries ready to be saved as JSON
+
+    Shares are of the wall time of the run, as the sections are timed with profile_timer.
+    """
+    seconds = profile_timer() - profile['start']
+    times = os.times()
+    patterns = profile['patterns']
+    events = profile['events']
+    phase_seconds = profile['phases']
+    phase_seconds['timestamps'] = patterns['timestamp'][2]
+    phase_seconds['patterns'] = sum(counts[2] for event, counts in patterns.items() if event != 'timestamp')
+    phase_seconds['aggregation'] = sum(counts[1] for counts in events.values())
+    phase_seconds['profiling'] = profile_overhead(profile)
+    #what is left of the parse once the timing is taken out is routing lines and building events
+    phase_seconds['events'] = max(profile['parse'] - phase_seconds['ingest'] - phase_seconds['timestamps'] - phase_seconds['patterns'] - phase_seconds['aggregation'] - phase_seconds['profiling'], 0.0)
+    report_dict = OrderedDict([('lines', profile['lines']), ('bytes', profile['bytes']), ('seconds', round(seconds, 6)), ('cpu_seconds', round(times[0] + times[1], 6)),
+                               ('lines_per_second', round(profile['lines'] / seconds, 1) if seconds else 0.0), ('mb_per_second', round(profile['bytes'] / 1048576.0 / seconds, 3) if seconds else 0.0),
+                               ('peak_rss', peak_rss()), ('assets', len(state['assetdata'])),
+                               ('asset_bytes', round(asset_memory(state['assetdata']) / float(len(state['assetdata'])), 1) if state['assetdata'] else None)])
+    report_dict['phases'] = OrderedDict((phase, OrderedDict([('seconds', round(phase_seconds[phase], 6)), ('wall_share', profile_share(phase_seconds[phase], seconds))])) for phase in profile_phases)
+    report_dict['patterns'] = OrderedDict((event, OrderedDict([('searches', searches), ('matches', matches), ('seconds', round(spent, 6)), ('mean_us', round(1e6 * spent / searches, 3) if searches else 0.0), ('wall_share', profile_share(spent, seconds))]))
+                                          for event, (searches, matches, spent) in patterns.items())
+    report_dict['events'] = OrderedDict((event, OrderedDict([('count', count), ('seconds', round(spent, 6)), ('mean_us', round(1e6 * spent / count, 3) if count else 0.0), ('wall_share', profile_share(spent, seconds))]))
+                                        for event, (count, spent) in events.items() if count)
+    samples = profile['samples'] + [(seconds, profile['lines'], profile['bytes'])]
+    report_dict['throughput'] = [OrderedDict([('seconds', round(elapsed, 3)), ('lines', lines), ('bytes', size)]) for elapsed, lines, size in samples]
+    return report_dict
+
+def throughput_slices(throughput, slices):
+    """Split the lines/sec samples of a profile report into up to slices (start, end, lines/sec) time slices"""
+    points = [(sample['seconds'], sample['lines']) for sample in throughput]
+    bounds = sorted(set(int(round(index * (len(points) - 1) / float(slices))) for index in range(slices + 1)))
+    result = []
+    for first, last in izip(bounds, bounds[1:]):
+        (start, start_lines), (end, end_lines) = points[first], points[last]
+        if end > start:
+            result.append((start, end, (end_lines - start_lines) / (end - start)))
+    return result
+
+def print_profile(report):
+    """Print the report of a profiled run as tables"""
+    rss = '{0:.0f} MB'.format(report['peak_rss'] / 1048576.0) if report['peak_rss'] is not None else 'n/a'
+    print('\nProfile: {0} lines, {1:.1f} MB in {2:.2f}s ({3:.0f} lines/sec, {4:.2f} MB/sec), CPU time {5:.2f}s, peak RSS {6}'.format(report['lines'], report['bytes'] / 1048576.0, report['seconds'], report['lines_per_second'], report['mb_per_second'], report['cpu_seconds'], rss))
+    if report['asset_bytes'] is not None:
+        print('Asset records: {0} in memory, {1:.0f} bytes each'.format(report['assets'], report['asset_bytes']))
+    else:
+        print('Asset records: none in memory')
+    print('\n{0:<20}{1:>12}{2:>9}'.format('Phase', 'Seconds', '% wall'))
+    for phase, entry in report['phases'].items():
+        print('{0:<20}{1:>12.3f}{2:>8.1f}%'.format(phase, entry['seconds'], entry['wall_share']))
+    print('\n{0:<20}{1:>12}{2:>12}{3:>12}{4:>12}{5:>9}'.format('Pattern', 'Searches', 'Matches', 'Seconds', 'Mean us', '% wall'))
+    for event, entry in report['patterns'].items():
+        print('{0:<20}{1:>12}{2:>12}{3:>12.3f}{4:>12.3f}{5:>8.1f}%'.format(event, entry['searches'], entry['matches'], entry['seconds'], entry['mean_us'], entry['wall_share']))
+    print('\n{0:<20}{1:>12}{2:>12}{3:>12}{4:>9}'.format('Event (aggregation)', 'Count', 'Seconds', 'Mean us', '% wall'))
+    for event, entry in report['events'].items():
+        print('{0:<20}{1:>12}{2:>12.3f}{3:>12.3f}{4:>8.1f}%'.format(event, entry['count'], entry['seconds'], entry['mean_us'], entry['wall_share']))
+    print('\n{0:<20}{1:>12}'.format('Seconds', 'Lines/sec'))
+    for start, end, rate in throughput_slices(report['throughput'], profile_slices):
+        print('{0:<20}{1:>12.0f}'.format('{0:.1f} - {1:.1f}'.format(start, end), rate))
+
 def main():
     
     def verbose_output(site, message, timestamp):
         """Print or write to file a verbose message when verbose output is enabled."""
-        verbosetext = '[Site: {0}] {1} at {2}'.format(site, message, timestamp)
+        verbosetext = '[Site: {0}] {1} at {2}'.format(site, message, format_timestamp(timestamp))
         if options.verbose:
-            print verbosetext
+            print(verbosetext)
         if options.outverbose:
             outf.write(verbosetext + '\n')
 
-    def init_asset(site, timestamp):
-        """Create dictionary for a newly added asset"""
-        asset_dict = {'sitename':site,'alive': '','tcptime':'','tcpports':0,'tcpportlist':[],'udptime':'','udpports':0,'udpportlist':[],'udpmaybeports':'','udpmaybeportlist':'','nodestart':'','nodeend':'','spiderstart':'','spiderend':'','urls':0, 'last_timestamp':timestamp, 'first_timestamp':timestamp, 'completed': 'No', 'vulns':0, 'fingerprint_certainty':''}
-        return asset_dict
-
-    def init_site(timestamp):
-        """Create dictionary for a newly added site"""
-        site_dict = {'scan_start':[], 'scan_pause':[], 'scan_stop':[], 'scan_durations':[], 'scan_total_duration':'', 'last_timestamp':timestamp, 'first_timestamp':timestamp, 'dead_ips':[], 'completed': 'No'}
-        return site_dict
-
-    def calc_duration(start, end):
-        """Calculate the duration between two timestamps"""
-        duration = datetime.strptime(end, time_format) - datetime.strptime(start, time_format)
-        return duration
+    def stream_output(key, record, durations):
+        """Write the record of a completed asset to the stream file, as JSON Lines or a CSV row"""
+        row = asset_row(key, record, durations)
+        if options.stream.endswith('.jsonl'):
+            outs.write(json_line(OrderedDict(izip(headers, row))))
+        else:
+            streamwriter.writerow(row)
 
-    usage = "usage: %prog <file> [options]"
+    usage = "usage: %prog [index] <file or directory> [<file or directory> ...] [options]"
     parser = OptionParser(usage)
     parser.add_option("-o", "--out", dest="outfile", help="Output results to flat text FILE (optional).", metavar="FILE")
-    #todo: implement csv output
-    parser.add_option("-c", "--csv", dest="csvfile", help="Output results to CSV FILE (optional)", metavar="FILE")
+    parser.add_option("-c", "--csv", dest="csvfile", help="Output results to CSV FILE, and site summaries to FILE_summary.csv (optional)", metavar="FILE")
     parser.add_option("-v", "--verbose", action="store_true", dest="verbose", default=False, help="Enable verbose console output. Warning: very spammy!")
     parser.add_option("-u", "--outverbose", dest="outverbose", default=False, help="Enable verbose file output. Warning: very spammy!", metavar="FILE")
+    parser.add_option("-n", "--top", type="int", dest="top", default=5, help="Number of slowest assets listed per site for each scan phase (default: 5).", metavar="N")
     parser.add_option("-q", "--quiet", action="store_true", dest="quiet", default=False, help="Only show brief summary in console output.")
+    parser.add_option("-j", "--jobs", type="int", dest="jobs", help="Parse a single log in N parallel processes, decompress up to N compressed or rotated logs in parallel, or parse the logs of N scan engines at a time (default: 1, or one process per engine up to the number of CPUs).", metavar="N")
+    parser.add_option("-f", "--follow", action="store_true", dest="follow", default=False, help="Keep reading the log as it grows, refreshing the summary and CSV output.")
+    parser.add_option("-s", "--state", dest="statefile", help="Save parser state to FILE and resume from it on the next run, parsing only new log lines.", metavar="FILE")
+    parser.add_option("-S", "--stream", dest="stream", help="Write each asset to FILE as soon as its node scan completes, and drop it from memory; JSON Lines if FILE ends in .jsonl, CSV otherwise. Memory still holds the assets whose node scan has not completed, including any that never do, the IP of each asset streamed out in the last 10 grace windows, and per site a count of each distinct phase duration in seconds (optional).", metavar="FILE")
+    parser.add_option("-g", "--grace", type="int", dest="grace", default=60, help="Seconds of log time a completed asset is kept for late lines before it is streamed out; lines logged for it up to 10 times as long afterwards are ignored (default: 60).", metavar="SECONDS")
+    parser.add_option("-r", "--runs", action="store_true", dest="runs", default=False, help="Split the log into the scan runs of each site, including pauses and resumes, and report each run on its own line and CSV row; runs are analyzed in parallel with --jobs.")
+    parser.add_option("--index", dest="indexfile", help="SQLite index of the log, built by the index command and used for --site / --ip queries (default: <file>.index).", metavar="FILE")
+    parser.add_option("--site", dest="site", help="Report only on SITE, reading just its lines found through the log index.", metavar="SITE")
+    parser.add_option("--ip", dest="ip", help="Report only on the asset at ADDRESS and show its timeline, reading just its lines found through the log index.", metavar="ADDRESS")
+    parser.add_option("--no-cache", action="store_true", dest="nocache", default=False, help="Parse the logs even if their parse result is cached, and do not cache it.")
+    parser.add_option("--cache-dir", dest="cachedir", default=os.path.join(os.path.expanduser('~'), '.cache', 'logtime'), help="Directory parse results are cached in (default: ~/.cache/logtime).", metavar="DIR")
+    parser.add_option("--cache-size", type="int", dest="cachesize", default=1024, help="Megabytes of cached parse results to keep, evicting the least recently used (default: 1024).", metavar="MB")
+    parser.add_option("--profile", dest="profile", help="Time each line pattern, event type and phase of the run, and sample lines/sec and peak memory; printed as tables after the report and saved as JSON to FILE (optional).", metavar="FILE")
+    parser.add_option("-i", "--interval", type="float", dest="interval", default=5, help="Seconds between checks for new lines in follow mode (default: 5).", metavar="SECONDS")
 
     (options, args) = parser.parse_args()
+    latin1_console()
+    #site names and IPs are matched against log lines, so they are read the way the log is
+    if options.site is not None:
+        options.site = text_arg(options.site)
+    if options.ip is not None:
+        options.ip = text_arg(options.ip)
 
+    #"index" updates the log index without reporting on the log
+    index_only = len(args) > 1 and args[0] == 'index'
+    if index_only:
+        args = args[1:]
     if len(args) < 1:
         parser.error("A log file name is required as input.")
     else:
-        filename = args[0]
+        #file names may be globs, compressed logs or ZIP archives, e.g. "nse.log*"
+        logs = expand_inputs(args)
+    #logs that are not rotations of one another come from separate scan engines, parsed concurrently and merged
+    engines = group_engines(logs)
+    aggregate = len(engines) > 1
+    if options.jobs is None:
+        options.jobs = min(len(engines), cpu_count()) if aggregate else 1
+    single_log = len(logs) == 1 and logs[0][1] is None and not compression_type(logs[0][0])
+    if single_log:
+        filename = logs[0][0]
     if options.quiet:
         options.verbose = False
+    if not (options.verbose or options.outverbose):
+        #verbose messages are then not even formatted
+        verbose_output = no_output
+    if single_log and options.jobs > 1 and (options.verbose or options.outverbose):
+        parser.error("Verbose output is only available when parsing with a single job.")
+    if single_log and options.jobs > 1 and options.stream:
+        parser.error("Streaming output is only available when parsing with a single job.")
+    if aggregate and (options.verbose or options.outverbose or options.stream):
+        parser.error("Verbose and streaming output are only available for the logs of a single scan engine.")
+    if (options.follow or options.statefile) and not single_log:
+        parser.error("Follow mode and state files need a single uncompressed log.")
+    if options.jobs > 1 and (options.follow or options.statefile):
+        parser.error("Follow mode and state files are only available when parsing with a single job.")
+    use_index = index_only or options.site is not None or options.ip is not None
+    if use_index and not single_log:
+        parser.error("The log index needs a single uncompressed log.")
+    if options.site is not None and options.ip is not None:
+        parser.error("Query either a site or an IP, not both.")
+    if use_index and (options.follow or options.statefile or options.stream):
+        parser.error("Index queries cannot be combined with follow mode, state files or streaming.")
+    if options.profile and (aggregate or options.runs or options.follow or (single_log and options.jobs > 1)):
+        parser.error("Profiling needs the logs parsed in this process: it cannot be combined with several scan engines, scan runs, follow mode or parallel parsing of a single log.")
+    #a cached parse result cannot replay verbose output, stream assets out, nor be profiled
+    use_cache = not (options.nocache or options.verbose or options.outverbose or options.stream or options.profile)
+    profile = init_profile() if options.profile else None
+    if options.runs and not single_log:
+        parser.error("Splitting a log into scan runs needs a single uncompressed log.")
+    if options.runs and (options.follow or options.statefile or options.stream or use_index or options.verbose or options.outverbose):
+        parser.error("Scan runs cannot be combined with follow mode, state files, streaming, index queries or verbose output.")
+
+    def write_report(state):
+        """Print the site summaries and (re)write the CSV output for the parser state"""
+        #open a specified CSV file for writing, with the site summaries next to it, e.g. scan.csv and scan_summary.csv
+        if options.csvfile:
+            outcsvsum = '_summary'.join(os.path.splitext(options.csvfile))
+            with open_output(options.csvfile) as outc, open_output(outcsvsum) as outcs:
+                csvwriter = csv.writer(outc)
+                csvsumwriter = csv.writer(outcs)
+                if state['site_engines']:
+                    csvwriter.writerow(headers + ['Engines'])
+                    csvsumwriter.writerow(summary_headers + ['Engines'])
+                else:
+                    csvwriter.writerow(headers)
+                    csvsumwriter.writerow(summary_headers)
+                summarize(state, options, csvwriter, csvsumwriter)
+        else:
+            summarize(state, options)
 
     try:
         #if we're writing verbose output, let's open the specified file for writing
         if options.outverbose:
-            outf = open(options.outverbose, 'wb')
+            outf = open_output(options.outverbose)
 
-        #the magic begins - open file as read-only, and binary mode due to Windows bug with special chars
-        with open(filename, 'rb') as f:
-            sitedata = {}
-            assetdata = {}
-            for line in f:
-                #check to see if any regexes match in the current line of the log file
-                ip = ipPattern.search(line)
-                alive = alivePattern.search(line)
-                dead = deadPattern.search(line)
-                tcp_port = tcpPattern.search(line)
-                udp_port = udpPattern.search(line)
-                node_start = startPattern.search(line)
-                node_end = endPattern.search(line)
-                spider_start = spiderStartPattern.search(line)
-                spider_end = spiderEndPattern.search(line)
-                scan_start = scanStartPattern.search(line)
-                scan_pause = scanPausePattern.search(line)
-                scan_stop = scanStopPattern.search(line)
-                system_fingerprint = sysFingerprintPattern.search(line)
-                log_timestamp = timePattern.search(line)
-                site_name = sitePattern.search(line)
-                spider_summary = spiderSummaryPattern.search(line)
-                vuln = vulnerablePattern.search(line)
-
-                if log_timestamp:
-                    timestamp = log_timestamp.group()
-
-                if site_name:
-                    sitename = site_name.group(1)
-                    if sitename in sitedata:
-                        sitedata[sitename]['last_timestamp'] = timestamp
-                    else:
-                        sitedata[sitename] = init_site(timestamp)
-                        sitedata[sitename]['first_timestamp'] = timestamp
-                        verbose_output(sitename, 'found in log', timestamp)
-    
-                if scan_start:                                        
-                    verbose_output(sitename, 'scan STARTED', timestamp)
-                    if sitename in sitedata:
-                        sitedata[sitename]['scan_start'].append(timestamp)
-                    else:
-                        sitedata[sitename] = init_site(timestamp)
-                        sitedata[sitename]['scan_start'].append(timestamp)
-
-                if scan_pause:
-                    verbose_output(sitename, 'scan PAUSED', timestamp)
-                    if sitename in sitedata:
-                        sitedata[sitename]['scan_pause'].append(timestamp)
-                    else:
-                        sitedata[sitename] = init_site(timestamp)
-                        sitedata[sitename]['scan_pause'].append(timestamp)
-                    
-                if scan_stop:
-                    verbose_output(sitename, 'scan STOPPED', timestamp)
-                    if sitename in sitedata:
-                        sitedata[sitename]['scan_stop'].append(timestamp)
-                        sitedata[sitename]['completed'] = 'Yes'
-                    else:
-                        sitedata[sitename] = init_site(timestamp)
-                        sitedata[sitename]['scan_stop'].append(timestamp)
-                        sitedata[sitename]['completed'] = 'Yes'
-                    
-                if ip:
-                    ip = ip.group(1)
-                    if ip in assetdata:
-                        assetdata[ip]['last_timestamp'] = timestamp
-                    elif not dead:
-                        assetdata[ip] = init_asset(sitename, timestamp)
-                        if not alive:
-                                verbose_output(sitename, 'Asset {0} found in log before ALIVE status'.format(ip), timestamp)
-
-                if alive:
-                    if ip in assetdata:
-                        assetdata[ip]['alive'] = timestamp
-                        verbose_output(sitename, 'Asset {0} found ALIVE'.format(ip), timestamp)                
-                    else:
-                        assetdata[ip] = init_asset(sitename, timestamp)
-                        assetdata[ip]['alive'] = timestamp
-                        verbose_output(sitename, 'Asset {0} found ALIVE'.format(ip), timestamp)
-
-                if dead:
-                    sitedata[sitename]['dead_ips'].append(ip)                
-                    verbose_output(sitename, 'Asset {0} found DEAD'.format(ip), timestamp)
-
-                if tcp_port:
-                    tcpport = tcp_port.group('port')
-                    tcpreason = tcp_port.group('reason')
-                    assetdata[ip]['tcpportlist'].append(tcpport)
-                    assetdata[ip]['tcpports'] = len(assetdata[ip]['tcpportlist'])
-                    if not assetdata[ip]['tcptime']:
-                        assetdata[ip]['tcptime'] = timestamp
-                    verbose_output(sitename, 'Asset {0} found open TCP port {1} reason: {2}'.format(ip, tcpport, tcpreason),timestamp)
-
-                if udp_port:
-                    udpport = udp_port.group('port')
-                    udpreason = udp_port.group('reason')
-                    assetdata[ip]['udpportlist'].append(udpport)
-                    assetdata[ip]['udpports'] = len(assetdata[ip]['udpportlist'])
-                    if not assetdata[ip]['udptime']:
-                        assetdata[ip]['udptime'] = timestamp
-                    verbose_output(sitename, 'Asset {0} found open UDP port {1} reason: {2}'.format(ip, udpport, udpreason),timestamp)
-
-                if node_start:
-                    if ip and log_timestamp:
-                        assetdata[ip]['nodestart'] = timestamp
-                        verbose_output(sitename, 'Asset {0} node scan started'.format(ip), timestamp)
-
-                if node_end:
-                    if ip and log_timestamp:
-                        assetdata[ip]['nodeend'] = timestamp
-                        assetdata[ip]['completed'] = 'Yes'
-                        verbose_output(sitename, 'Asset {0} node scan ended'.format(ip), timestamp)                      
-
-                if spider_start:
-                    if ip and log_timestamp:                        
-                        if not assetdata[ip]['spiderstart']:
-                            assetdata[ip]['spiderstart'] = timestamp
-                            verbose_output(sitename, 'Asset {0} web spider started'.format(ip), timestamp)
-
-                if spider_end:
-                    if ip and log_timestamp:
-                        assetdata[ip]['spiderend'] = timestamp
-                        verbose_output(sitename, 'Asset {0} web spider ended'.format(ip), timestamp)
-
-                if spider_summary:
-                    if ip and log_timestamp:
-                        if not assetdata[ip]['urls'] or assetdata[ip]['urls'] < spider_summary.group('urls'):
-                            assetdata[ip]['urls'] = spider_summary.group('urls')
-                if vuln:
-                    if ip:
-                        assetdata[ip]['vulns'] += 1
-
-                if system_fingerprint:
-                    if ip:
-                        assetdata[ip]['fingerprint_certainty'] = system_fingerprint.group('certainty')
-                        verbose_output(sitename, 'Asset {0} fingerprint certainty: {1}'.format(ip, system_fingerprint.group('certainty')), timestamp)
+        #stream completed assets out as the log is parsed, appending to the stream of the run a state file resumes
+        stream = None
+        if options.stream:
+            outs = open_output(options.stream, 'a' if options.statefile and os.path.exists(options.statefile) else 'w')
+            streamwriter = csv.writer(outs)
+            if not options.stream.endswith('.jsonl') and not os.path.getsize(options.stream):
+                streamwriter.writerow(headers)
+            stream = init_stream(stream_output, options.grace, options.top)
+
+        #the magic begins - parse the log, split across worker processes when asked to
+        if use_index:
+            #bring the index up to date, then parse only the lines it points to
+            db = open_index(options.indexfile or filename + '.index')
+            try:
+                indexed = update_index(db, filename)
+                if index_only:
+                    print('Indexed {0} bytes of {1}'.format(indexed, filename))
+                    return
+                state = parse_indexed_lines(filename, index_contexts(db, options.site, options.ip), init_state(), verbose_output, profile)
+                if options.ip is not None:
+                    print('Timeline for [Asset: {0}]'.format(options.ip))
+                    for timestamp, site, events in ip_timeline(db, options.ip):
+                        print('{0} [Site: {1}] {2}'.format(format_timestamp(timestamp), site, events.replace(',', ', ')))
+            finally:
+                db.close()
+        elif options.follow or options.statefile:
+            if options.statefile:
+                checkpoint = load_checkpoint(options.statefile)
+            else:
+                checkpoint = init_checkpoint()
+            state = checkpoint['state']
+            f, rotated = open_checkpointed_log(filename, checkpoint)
+            try:
+                if rotated:
+                    #finish the part of the rotated log the checkpoint had not reached yet
+                    parse_lines(read_lines(*rotated), state, verbose_output, stream, profile)
+                while True:
+                    offset = checkpoint['offset']
+                    parse_lines(read_appended_lines(f, checkpoint), state, verbose_output, stream, profile)
+                    if stream is not None:
+                        #the streamed assets are no longer in the state, so they must be on disk before it is saved
+                        outs.flush()
+                    if options.statefile:
+                        save_checkpoint(options.statefile, checkpoint)
+                    if not options.follow:
+                        break
+                    if checkpoint['offset'] != offset:
+                        write_report(state)
+                    time.sleep(options.interval)
+                    if log_replaced(filename, checkpoint):
+                        #drain what was written to the old log before it was replaced
+                        parse_lines(iter(f.readline, b''), state, verbose_output, stream)
+                        f.close()
+                        print('Log {0} was rotated or truncated, reading it from the start'.format(filename))
+                        checkpoint['inode'] = None
+                        f, rotated = open_checkpointed_log(filename, checkpoint)
+            finally:
+                f.close()
+        elif options.runs:
+            #each scan run is parsed and summarized on its own, so runs can be compared and analyzed in parallel
+            tasks = []
+            for site, run, ranges in find_scan_runs(filename):
+                if site is None:
+                    print('Scan run {0} started before any site was logged, skipped'.format(run))
+                    continue
+                tasks.append((filename, site, run, ranges, options.top))
+            pool = Pool(options.jobs) if options.jobs > 1 else None
+            try:
+                rows = pool.imap(analyze_run, tasks) if pool else imap(analyze_run, tasks)
+                if options.csvfile:
+                    with open_output(options.csvfile) as outc:
+                        csvwriter = csv.writer(outc)
+                        csvwriter.writerow(run_headers)
+                        write_runs(rows, csvwriter)
+                else:
+                    write_runs(rows)
+            finally:
+                if pool:
+                    pool.terminate()
+            return
+        elif aggregate:
+            #each engine is parsed and cached on its own, so new lines in one engine's log only re-parse that engine
+            tasks = [(group, options.cachedir if use_cache else None, options.cachesize * 1024 * 1024) for name, group in engines]
+            pool = Pool(options.jobs) if options.jobs > 1 else None
+            try:
+                packed = pool.imap(parse_engine, tasks) if pool else imap(parse_engine, tasks)
+                state = merge_engines(imap(unpack_state, packed), [name for name, group in engines])
+            finally:
+                if pool:
+                    pool.terminate()
+        else:
+            state = None
+            if use_cache:
+                #logs parsed before are loaded from the cache instead of being parsed again
+                key = cache_key(logs)
+                state = load_cache(options.cachedir, key)
+            if state is None:
+                if not single_log:
+                    state = parse_lines(read_inputs(logs, options.jobs), init_state(), verbose_output, stream, profile)
+                elif options.jobs > 1:
+                    pool = Pool(options.jobs)
+                    try:
+                        state = merge_chunks(pool.imap(parse_chunk, chunk_ranges(filename, options.jobs * 4)))
+                    finally:
+                        pool.terminate()
+                else:
+                    state = parse_lines(read_lines(filename), init_state(), verbose_output, stream, profile)
+                if use_cache:
+                    save_cache(options.cachedir, key, pack_state(state), options.cachesize * 1024 * 1024)
 
     except KeyboardInterrupt:
-        print '\nExit: Interrupted by user.'
+        print('\nExit: Interrupted by user.')
         exit(0)
 
+    if stream is not None:
+        if not options.statefile:
+            #nothing more will be parsed, so the assets still in their grace window are final
+            stream_completed(state, stream)
+        outs.close()
+
     #open a specified plaintext file for writing
     if not options.outverbose:
         if options.outfile:
-            outf = open(options.outfile, 'wb')
-
-    #todo: implement CSV output (in particular, summary csv file)
-    #open a specified CSV file for writing
-    if options.csvfile:
-        #outcsvsum = ''.join((options.csvfile.rstrip('.csv'),'_summary.csv'))
-        outc = open(options.csvfile, 'wb')
-        #outcs = open(outcsvsum, 'w')
-        csvwriter = csv.writer(outc)
-        #csvsumwriter = csv.writer(outcs)
-        csvwriter.writerow(headers)
-        #csvsumwriter.write(summary_headers)
+            outf = open_output(options.outfile)
 
     try:
-        #total up scan durations for each site found in scan log
-        for site in sitedata:
-            starts = len(sitedata[site]['scan_start'])
-            pauses = len(sitedata[site]['scan_pause'])
-            stops = len(sitedata[site]['scan_stop'])
-
-            if pauses >= 1:
-                if starts >= pauses:
-                    for start, pause in izip(sitedata[site]['scan_start'], sitedata[site]['scan_pause']):
-                        sitedata[site]['scan_durations'].append(calc_duration(start, pause))                    
-
-            if stops <= 0:
-                sitedata[site]['scan_stop'].append(sitedata[site]['last_timestamp'])
-
-            sitedata[site]['scan_durations'].append(calc_duration(sitedata[site]['scan_start'][starts - 1], sitedata[site]['scan_stop'][stops - 1]))
-
-            total = timedelta(0)
-            for duration in sitedata[site]['scan_durations']:
-                total = total + duration
-
-            sitedata[site]['scan_total_duration'] = total
-            longestscan = {'site':'','asset':'','time':timedelta(0)}
-            shortestscan = {'site':'','asset':'','time':timedelta(365)}
-            alivecount = 0
-            scannedcount = 0
-            node_times = []
-            discovery_times = []
-            spider_times = []
-
-            for asset in assetdata:
-                if assetdata[asset]['sitename'] == site:
-                    if assetdata[asset]['nodeend'] and assetdata[asset]['nodestart']:
-                        assetdata[asset]['nodetime'] = calc_duration(assetdata[asset]['nodestart'], assetdata[asset]['nodeend'])
-                        node_times.append(assetdata[asset]['nodetime'])
-                    elif assetdata[asset]['nodestart']:
-                        assetdata[asset]['nodetime'] = calc_duration(assetdata[asset]['nodestart'], assetdata[asset]['last_timestamp'])
-                        node_times.append(assetdata[asset]['nodetime'])
-                    else:
-                        assetdata[asset]['nodetime'] = 'Unknown'
-
-                    if assetdata[asset]['alive']:
-                        assetdata[asset]['discoverytime'] = calc_duration(sitedata[site]['scan_start'][0], assetdata[asset]['alive'])
-                        discovery_times.append(assetdata[asset]['discoverytime'])                    
-                    elif assetdata[asset]['tcptime']:
-                        assetdata[asset]['discoverytime'] = calc_duration(sitedata[site]['scan_start'][0], assetdata[asset]['tcptime'])
-                        discovery_times.append(assetdata[asset]['discoverytime'])                    
-                    elif assetdata[asset]['udptime']:
-                        assetdata[asset]['discoverytime'] = calc_duration(sitedata[site]['scan_start'][0], assetdata[asset]['udptime'])
-                        discovery_times.append(assetdata[asset]['discoverytime'])                    
-                    else:
-                        assetdata[asset]['discoverytime'] = 'Unknown'
-
-                    if assetdata[asset]['spiderend'] and assetdata[asset]['spiderstart']:
-                        assetdata[asset]['spidertime'] = calc_duration(assetdata[asset]['spiderstart'], assetdata[asset]['spiderend'])
-                        spider_times.append(assetdata[asset]['spidertime'])
-                    elif assetdata[asset]['spiderstart']:
-                        assetdata[asset]['spidertime'] = calc_duration(assetdata[asset]['spiderstart'], assetdata[asset]['last_timestamp'])
-                        spider_times.append(assetdata[asset]['spidertime'])
-                    else:
-                        assetdata[asset]['spidertime'] = 'Unknown'
-
-                    if assetdata[asset]['discoverytime'] != 'Unknown' and assetdata[asset]['nodetime'] != 'Unknown':
-                        assetdata[asset]['totaltime'] = assetdata[asset]['discoverytime'] + assetdata[asset]['nodetime']
-                    else:
-                        assetdata[asset]['totaltime'] = 'Unknown'
-
-                    if assetdata[asset]['totaltime'] != 'Unknown' and assetdata[asset]['totaltime'] > longestscan['time']:
-                        longestscan['site'] = assetdata[asset]['sitename']
-                        longestscan['asset'] = asset
-                        longestscan['time'] = assetdata[asset]['totaltime']
-
-                    if assetdata[asset]['totaltime'] != 'Unknown' and assetdata[asset]['totaltime'] < shortestscan['time']:
-                        shortestscan['site'] = assetdata[asset]['sitename']
-                        shortestscan['asset'] = asset
-                        shortestscan['time'] = assetdata[asset]['totaltime']
-
-                    if assetdata[asset]['alive']:
-                        alivecount += 1
-
-                    if assetdata[asset]['nodeend']:
-                        scannedcount += 1
-
-                    #outtext = 'Site: %s | Asset: %s | Open Ports: %s | Discovery Time: %s | Spider Time: %s | Node Time: %s | Total Time: %s' % (assetdata[asset]['sitename'],asset.ljust(15), str(assetdata[asset]['tcpports']).ljust(5), str(assetdata[asset]['discoverytime']).ljust(17), str(assetdata[asset]['spidertime']).ljust(17), str(assetdata[asset]['nodetime']).ljust(17), str(assetdata[asset]['totaltime']))
-
-                    if not options.quiet:
-                        #print outtext
-                        pass
-
-                    if options.outfile:
-                        #outf.write(outtext + '\n')
-                        pass
-
-                    if options.csvfile:
-                        csvwriter.writerow((assetdata[asset]['sitename'], asset, assetdata[asset]['tcpports'], assetdata[asset]['udpports'], str(assetdata[asset]['discoverytime']), str(assetdata[asset]['urls']), str(assetdata[asset]['spidertime']), str(assetdata[asset]['nodetime']), str(assetdata[asset]['totaltime']), assetdata[asset]['completed'], ', '.join(assetdata[asset]['tcpportlist']), ', '.join(assetdata[asset]['udpportlist']), str(assetdata[asset]['vulns']), str(assetdata[asset]['fingerprint_certainty']) ))
-
-
-            if discovery_times:
-                average_discovery_time = sum(discovery_times, default_timestamp) / len(discovery_times)
-            else:
-                average_discovery_time = 'Unknown'
-            if node_times:
-                average_node_time = sum(node_times, default_timestamp) / len(node_times)
-            else:
-                average_node_time = 'Unknown'
-            if spider_times:
-                average_spider_time = sum(spider_times, default_timestamp) / len(spider_times)
-            else:
-                average_spider_time = 'Unknown'
-
-            print '\nSummary for [Site: %s]' % site
-            print 'Total assets logged: %i' % ((len(assetdata)+len(sitedata[sitename]['dead_ips'])))
-            print 'Total assets alive: %i' % (alivecount)
-            print 'Total assets scanned (complete): %i' % (scannedcount)
-            print 'Total scan time: %s' % total
-            print 'Scan completed: %s' % sitedata[site]['completed']
-            if longestscan['site']:
-                print 'Most scan time: %s @ %s' % (longestscan['asset'], longestscan['time'])
-            if shortestscan['site']:
-                print 'Least scan time: %s @ %s \n' % (shortestscan['asset'], shortestscan['time'])
-            print 'Average discovery time: %s' % average_discovery_time
-            print 'Average node time: %s' % average_node_time
-            print 'Average web spider time: %s' % average_spider_time
-
-        #todo: make sure each site detected can be summarized
-        #csvsumwriter.write(site, logged_assets, live_assets, scanned_assets, total_duration, high_duration_asset, high_duration, low_duration_asset, low_duration)
+        if profile is not None:
+            start = profile_timer()
+        write_report(state)
+        if profile is not None:
+            profile['phases']['output'] += profile_timer() - start
+            report = profile_report(profile, state)
+            print_profile(report)
+            with open(options.profile, 'w') as f:
+                json.dump(report, f, indent=2)
 
     except KeyboardInterrupt:
         if options.outfile:
             outf.close()
-        if options.csvfile:
-            outc.close()
-            #outcs.close()
-        print '\nExit: Interrupted by user'
+        print('\nExit: Interrupted by user')
         exit(0)
-        #close said file after writing
-        if options.outfile:
-            outf.close()
-        if options.csvfile:
-            outc.close()
-            #outcs.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,355 @@
+#-------------------------------------------------------------------------------
+# Name:        logtime_bench
+# Purpose:     Generate synthetic Nexpose scan logs and benchmark logtime on them
+#
+# Licence:     WTFPL
+#-------------------------------------------------------------------------------
+
+from __future__ import print_function
+from optparse import OptionParser
+import calendar
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import logtime
+
+#bumped whenever generated logs change, so stale benchmark logs are generated again
+generator_version = 1
+
+#log time the generated scans start at
+generator_start = calendar.timegm((2013, 1, 29, 10, 0, 0))
+
+#ports the generated assets have open
+generator_tcp_ports = (21, 22, 25, 80, 443, 8080, 3389, 445, 139, 23)
+generator_udp_ports = (161, 53, 123, 137, 500)
+
+size_units = {'K': 1024, 'M': 1024 * 1024, 'G': 1024 * 1024 * 1024}
+
+bench_headers = ['Size', 'Lines', 'Seconds', 'Lines/sec', 'MB/sec', 'Peak RSS (MB)', 'CLI -S sec', 'CLI -S RSS']
+
+#grace window and slowest assets kept of the streamed parses, as a -S run of logtime has by default
+stream_grace = 60
+stream_top = 10
+
+#log time between the last asset of a site and its stray lines, well past the grace window of a streamed
+#parse but before the keys of the assets streamed out are forgotten
+stray_delay = stream_grace * logtime.stream_memory // 2
+
+#stray lines per site of the log the streamed parse is checked on
+check_stray = 5
+
+def init_generator(seed):
+    """Create dictionary for the state of a synthetic log: its random numbers, log time and output size"""
+    generator_dict = {'random':random.Random(seed).random, 'time':generator_start, 'timestamp':None, 'bytes':0, 'lines':0}
+    return generator_dict
+
+def pick(generator, count):
+    """Return a random number below count
+
+    Only random() is used, as it gives the same numbers for a seed on Python 2 and 3.
+    """
+    return int(generator['random']() * count)
+
+def log_line(generator, lines, site, thread, message):
+    """Append a log line, moving the log time on by 0 to 2 seconds"""
+    step = pick(generator, 5)
+    if step > 2:
+        generator['time'] += step - 2
+        generator['timestamp'] = None
+    if generator['timestamp'] is None:
+        generator['timestamp'] = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(generator['time']))
+    lines.append('{0} [INFO] [Thread: {1}] [Site: {2}] {3}\n'.format(generator['timestamp'], thread, site, message))
+
+def asset_ip(address):
+    """Return the IP address of the asset numbered address"""
+    return '10.{0}.{1}.{2}'.format((address >> 16) & 255, (address >> 8) & 255, address & 255)
+
+def log_noise(generator, lines, site, ip, count):
+    """Append lines without scan events, as most lines of a real log are"""
+    for line in range(pick(generator, count + 1)):
+        kind = pick(generator, 10)
+        if kind < 3:
+            log_line(generator, lines, site, 'Scanner:' + ip, '[{0}] Executing check {1}'.format(ip, pick(generator, 100000)))
+        elif kind < 5:
+            log_line(generator, lines, site, 'Scan default:1', 'Loading plugin com.rapid7.plugin{0}'.format(pick(generator, 1000)))
+        elif kind < 6:
+            #continuation lines carry neither a timestamp nor a site
+            lines.append('\tat com.rapid7.nexpose.Scanner.run(Scanner.java:{0})\n'.format(pick(generator, 1000)))
+        else:
+            log_line(generator, lines, site, 'Scanner:' + ip, '[{0}:{1}] service probe completed'.format(ip, pick(generator, 65536)))
+
+def log_asset(generator, lines, site, ip, options):
+    """Append the lines of the scan of one asset"""
+    if generator['random']() < options['dead']:
+        log_line(generator, lines, site, 'Scan default:1', '[{0}] DEAD (reason=no-response)'.format(ip))
+        return
+    log_line(generator, lines, site, 'Scan default:1', '[{0}] ALIVE (reason=echo-reply:TTL=64)'.format(ip))
+    for port in generator_tcp_ports[:pick(generator, options['tcp_ports'] + 1)]:
+        log_line(generator, lines, site, 'Scan default:1', '[{0}:{1}/TCP] OPEN (reason=syn-ack:TTL=64)'.format(ip, port))
+    for port in generator_udp_ports[:pick(generator, options['udp_ports'] + 1)]:
+        log_line(generator, lines, site, 'Scan default:1', '[{0}:{1}/UDP] OPEN (reason=udp-response:TTL=64)'.format(ip, port))
+    log_noise(generator, lines, site, ip, options['noise'])
+    log_line(generator, lines, site, 'Scanner:' + ip, '[{0}] starting node scan'.format(ip))
+    log_noise(generator, lines, site, ip, options['noise'])
+    if generator['random']() < options['spider']:
+        log_line(generator, lines, site, 'SPIDER::do-http-spiderv2-setup@' + ip, '[{0}:80] spider setup'.format(ip))
+        log_noise(generator, lines, site, ip, options['noise'])
+        log_line(generator, lines, site, 'Spider:' + ip, 'Shutting down spider ({0} URLs spidered in 12s)'.format(pick(generator, 1000) + 1))
+        log_line(generator, lines, site, 'Spider:' + ip, '[{0}] Closing service: NexposeWebSpider[{0}:80]  (source: spider)'.format(ip))
+    log_line(generator, lines, site, 'Scanner:' + ip, '[{0}] Added SystemFingerprint Linux [certainty=0.{1}][description=Linux 2.6] xx source: nmap'.format(ip, pick(generator, 99) + 1))
+    for vuln in range(pick(generator, options['vulns'] + 1)):
+        log_line(generator, lines, site, 'Scanner:' + ip, '[{0}] check {1} - VULNERABLE'.format(ip, pick(generator, 10000)))
+    log_noise(generator, lines, site, ip, options['noise'])
+    #a few node scans never finish
+    if generator['random']() < 0.95:
+        log_line(generator, lines, site, 'Scanner:' + ip, '[{0}] Freeing node cache data'.format(ip))
+
+def log_stray(generator, lines, site, first, count):
+    """Append a late line for each of the last count assets of a site, long after their scans ended"""
+    generator['time'] += stray_delay
+    generator['timestamp'] = None
+    for address in range(first, first + count):
+        log_line(generator, lines, site, 'Scanner:' + asset_ip(address), '[{0}] check {1} - VULNERABLE'.format(asset_ip(address), pick(generator, 10000)))
+
+def generate_log(out, sites=3, assets=100, tcp_ports=4, udp_ports=1, spider=0.4, dead=0.1, vulns=3, noise=8, seed=1, size=None, stray=0):
+    """Write a synthetic scan log to a binary file object and return the number of (lines, bytes) written
+
+    Each site scans assets numbered on from the last site's, so every asset has its own IP address;
+    assets have up to tcp_ports / udp_ports open ports and up to vulns vulnerabilities, a spider and
+    dead fraction of them are spidered / found dead, and up to noise lines without scan events are
+    logged between their scan events. Every fourth site is paused half way and resumed. With a size
+    in bytes, sites keep being added until the log is at least that large. With stray lines, that
+    many of the last assets of each site are logged again at the end of its scan. The same
+    arguments always give the same log.
+    """
+    options = {'tcp_ports':tcp_ports, 'udp_ports':udp_ports, 'spider':spider, 'dead':dead, 'vulns':vulns, 'noise':noise}
+    generator = init_generator(seed)
+    number = 0
+    while number < sites or (size is not None and generator['bytes'] < size):
+        site = 'Site {0}'.format(number)
+        lines = []
+        log_line(generator, lines, site, 'Scan default:1', 'Scan for site {0} started by user'.format(site))
+        for asset in range(assets):
+            log_asset(generator, lines, site, asset_ip(number * assets + asset + 1), options)
+            if number % 4 == 3 and asset == assets // 2:
+                log_line(generator, lines, site, 'Scan default:1', 'Scan paused by user')
+                log_line(generator, lines, site, 'Scan default:1', 'Scan for site {0} resumed'.format(site))
+            if len(lines) > 10000 or asset == assets - 1:
+                if asset == assets - 1:
+                    if stray:
+                        log_stray(generator, lines, site, (number + 1) * assets - min(stray, assets) + 1, min(stray, assets))
+                    log_line(generator, lines, site, 'Scan default:1', 'Scan completed.')
+                data = ''.join(lines).encode('ascii')
+                out.write(data)
+                generator['bytes'] += len(data)
+                generator['lines'] += len(lines)
+                lines = []
+        number += 1
+    return generator['lines'], generator['bytes']
+
+def parse_size(text):
+    """Convert a size such as 100M, 1G or 512K to bytes"""
+    unit = size_units.get(text[-1:].upper())
+    if unit is None:
+        return int(text)
+    return int(float(text[:-1]) * unit)
+
+def format_size(size):
+    """Format a byte count with the largest unit it is a whole multiple of, e.g. 1G"""
+    for unit in ('G', 'M', 'K'):
+        if size % size_units[unit] == 0:
+            return '{0}{1}'.format(size // size_units[unit], unit)
+    return str(size)
+
+def discard_asset(key, record, durations):
+    """Stream output that drops the completed assets, leaving only the running totals"""
+    pass
+
+def count_lines(path):
+    """Count the lines of a log, reading it once so the timed parse starts from a warm page cache"""
+    lines = 0
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(logtime.block_size), b''):
+            lines += block.count(b'\n')
+    return lines
+
+def measure(path):
+    """Parse a log as logtime -S does and return its line count, size, parse seconds and peak RSS
+
+    The log is read with read_lines and parsed with parse_lines, the path a -S run of a single
+    log takes, and completed assets are streamed out and dropped, so the peak RSS is that of the
+    parser and stays bounded however large the log is.
+    """
+    lines = count_lines(path)
+    start = time.time()
+    stream = logtime.init_stream(discard_asset, stream_grace, stream_top)
+    state = logtime.parse_lines(logtime.read_lines(path), logtime.init_state(), stream=stream)
+    logtime.stream_completed(state, stream)
+    seconds = time.time() - start
+    assets = len(state['assetdata']) + sum(site['totals']['assets'] for site in state['sitedata'].values())
+    result_dict = {'lines':lines, 'bytes':os.path.getsize(path), 'seconds':seconds, 'assets':assets, 'peak_rss':logtime.peak_rss()}
+    return result_dict
+
+def measure_cli(path):
+    """Run logtime -S on a log in a child process and return its seconds and peak RSS
+
+    This times the command as it is run, ingest, summary and stream output included.
+    """
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logtime.py')
+    start = time.time()
+    with open(os.devnull, 'wb') as devnull:
+        subprocess.check_call([sys.executable, script, path, '--no-cache', '-q', '-S', os.devnull], stdout=devnull)
+    seconds = time.time() - start
+    peak_rss = None
+    if logtime.resource is not None:
+        #the peak of the only child, in kilobytes on Linux and bytes on macOS
+        peak_rss = logtime.resource.getrusage(logtime.resource.RUSAGE_CHILDREN).ru_maxrss
+        if sys.platform != 'darwin':
+            peak_rss *= 1024
+    result_dict = {'cli_seconds':seconds, 'cli_peak_rss':peak_rss}
+    return result_dict
+
+def check_stream(path):
+    """Return a message for every site a streamed parse of a log totals up differently from a parse in memory"""
+    state = logtime.parse_lines(logtime.read_lines(path), logtime.init_state())
+    stream = logtime.init_stream(discard_asset, stream_grace, stream_top)
+    streamed = logtime.parse_lines(logtime.read_lines(path), logtime.init_state(), stream=stream)
+    logtime.stream_completed(streamed, stream)
+    mismatches = []
+    for site in state['site_order']:
+        totals, logged = logtime.site_totals(state, site, stream_top)
+        streamed_totals, streamed_logged = logtime.site_totals(streamed, site, stream_top)
+        expected = (logged, totals['alive'], totals['scanned'])
+        found = (streamed_logged, streamed_totals['alive'], streamed_totals['scanned'])
+        if found != expected:
+            mismatches.append('[Site: {0}] assets logged/alive/scanned: {1[0]}/{1[1]}/{1[2]} streamed, {2[0]}/{2[1]}/{2[2]} in memory'.format(site, found, expected))
+    return mismatches
+
+def benchmark_log(directory, size, seed):
+    """Return the path of the benchmark log of a size, generating it first if it does not exist yet"""
+    path = os.path.join(directory, 'nse-{0}-{1}-v{2}.log'.format(format_size(size), seed, generator_version))
+    if not os.path.exists(path):
+        print('Generating {0} log {1}'.format(format_size(size), path))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        temp = path + '.tmp'
+        with open(temp, 'wb') as f:
+            generate_log(f, assets=250, seed=seed, size=size)
+        os.rename(temp, path)
+    return path
+
+def run_benchmark(path, python):
+    """Measure the parse of a log and a logtime -S run on it, each in a new process, so each peak RSS is that of the one run"""
+    result = {}
+    for command in ('measure', 'measure-cli'):
+        output = subprocess.check_output([python, os.path.abspath(__file__), command, path])
+        result.update(json.loads(output.decode('ascii').splitlines()[-1]))
+    return result
+
+def result_row(size, result):
+    """Build the table row of a benchmark result"""
+    seconds = result['seconds'] or 1e-9
+    rss = '{0:.0f}'.format(result['peak_rss'] / 1048576.0) if result['peak_rss'] is not None else 'n/a'
+    cli_rss = '{0:.0f}'.format(result['cli_peak_rss'] / 1048576.0) if result['cli_peak_rss'] is not None else 'n/a'
+    return [format_size(size), str(result['lines']), '{0:.2f}'.format(result['seconds']), '{0:.0f}'.format(result['lines'] / seconds), '{0:.2f}'.format(result['bytes'] / 1048576.0 / seconds), rss, '{0:.2f}'.format(result['cli_seconds']), cli_rss]
+
+def compare_results(results, baseline, tolerance):
+    """Return a message for every result more than tolerance percent slower or larger than the baseline"""
+    regressions = []
+    for size, result in results.items():
+        before = baseline.get(size)
+        if before is None:
+            continue
+        rate, before_rate = result['lines'] / result['seconds'], before['lines'] / before['seconds']
+        if rate < before_rate * (1 - tolerance / 100.0):
+            regressions.append('{0}: {1:.0f} lines/sec, down from {2:.0f}'.format(size, rate, before_rate))
+        if result['peak_rss'] and before['peak_rss'] and result['peak_rss'] > before['peak_rss'] * (1 + tolerance / 100.0):
+            regressions.append('{0}: peak RSS {1:.0f} MB, up from {2:.0f} MB'.format(size, result['peak_rss'] / 1048576.0, before['peak_rss'] / 1048576.0))
+        #baselines saved before the logtime -S run was measured have no figures for it
+        if result.get('cli_peak_rss') and before.get('cli_peak_rss') and result['cli_peak_rss'] > before['cli_peak_rss'] * (1 + tolerance / 100.0):
+            regressions.append('{0}: logtime -S peak RSS {1:.0f} MB, up from {2:.0f} MB'.format(size, result['cli_peak_rss'] / 1048576.0, before['cli_peak_rss'] / 1048576.0))
+    return regressions
+
+def main():
+    usage = "usage: %prog [options]\n       %prog generate <file> [options]\n       %prog check [options]"
+    parser = OptionParser(usage)
+    parser.add_option("--sizes", dest="sizes", default="100M,1G,10G", help="Comma separated sizes of the logs to benchmark (default: 100M,1G,10G).", metavar="SIZES")
+    parser.add_option("-d", "--dir", dest="directory", default=os.path.join(tempfile.gettempdir(), 'logtime_bench'), help="Directory the generated benchmark logs are kept in, to be reused by later runs (default: <temp dir>/logtime_bench).", metavar="DIR")
+    parser.add_option("--python", dest="python", default=sys.executable, help="Python interpreter to parse the logs with (default: the one running the benchmark).", metavar="PATH")
+    parser.add_option("-o", "--out", dest="outfile", help="Save the results as JSON to FILE, e.g. as a baseline for later runs (optional).", metavar="FILE")
+    parser.add_option("-b", "--baseline", dest="baseline", help="Compare the results to those saved in FILE, exiting with status 1 on a regression (optional).", metavar="FILE")
+    parser.add_option("-t", "--tolerance", type="float", dest="tolerance", default=10, help="Percent lines/sec may drop or peak RSS may grow before it is a regression (default: 10).", metavar="PERCENT")
+    parser.add_option("--sites", type="int", dest="sites", default=3, help="Sites in a generated log (default: 3).", metavar="N")
+    parser.add_option("--assets", type="int", dest="assets", default=100, help="Assets per site in a generated log (default: 100).", metavar="N")
+    parser.add_option("--tcp-ports", type="int", dest="tcp_ports", default=4, help="Most open TCP ports per asset in a generated log (default: 4).", metavar="N")
+    parser.add_option("--udp-ports", type="int", dest="udp_ports", default=1, help="Most open UDP ports per asset in a generated log (default: 1).", metavar="N")
+    parser.add_option("--spider", type="float", dest="spider", default=0.4, help="Fraction of assets spidered in a generated log (default: 0.4).", metavar="FRACTION")
+    parser.add_option("--seed", type="int", dest="seed", default=1, help="Seed of a generated log; the same seed and options give the same log (default: 1).", metavar="N")
+    parser.add_option("--stray", type="int", dest="stray", default=0, help="Assets per site logged again after their scan ended in a generated log (default: 0).", metavar="N")
+    parser.add_option("--size", dest="size", help="Keep adding sites to a generated log until it is at least SIZE, e.g. 100M (optional).", metavar="SIZE")
+
+    (options, args) = parser.parse_args()
+
+    if args and args[0] == 'measure':
+        #run by run_benchmark in a new process
+        print(json.dumps(measure(args[1])))
+        return
+
+    if args and args[0] == 'measure-cli':
+        #run by run_benchmark in a new process, so its only child is the one logtime run
+        print(json.dumps(measure_cli(args[1])))
+        return
+
+    if args and args[0] == 'generate':
+        if len(args) < 2:
+            parser.error("A log file name to generate is required.")
+        with open(args[1], 'wb') as f:
+            lines, size = generate_log(f, options.sites, options.assets, options.tcp_ports, options.udp_ports, options.spider, seed=options.seed, size=parse_size(options.size) if options.size else None, stray=options.stray)
+        print('Generated {0} lines, {1} bytes in {2}'.format(lines, size, args[1]))
+        return
+
+    if args and args[0] == 'check':
+        #stray lines long after an asset was streamed out must not change the site totals
+        handle, path = tempfile.mkstemp(suffix='.log')
+        try:
+            with os.fdopen(handle, 'wb') as f:
+                generate_log(f, options.sites, options.assets, options.tcp_ports, options.udp_ports, options.spider, seed=options.seed, stray=options.stray or check_stray)
+            mismatches = check_stream(path)
+        finally:
+            os.remove(path)
+        for mismatch in mismatches:
+            print('Mismatch: ' + mismatch)
+        if mismatches:
+            exit(1)
+        print('Streamed and in-memory site totals match')
+        return
+
+    results = {}
+    print('  '.join(header.rjust(12) for header in bench_headers))
+    for size in [parse_size(text) for text in options.sizes.split(',')]:
+        path = benchmark_log(options.directory, size, options.seed)
+        results[format_size(size)] = result = run_benchmark(path, options.python)
+        print('  '.join(value.rjust(12) for value in result_row(size, result)))
+
+    if options.outfile:
+        with open(options.outfile, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if options.baseline:
+        with open(options.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, options.tolerance)
+        for regression in regressions:
+            print('Regression: ' + regression)
+        if regressions:
+            exit(1)
+        print('No regressions against {0} (tolerance {1:g}%)'.format(options.baseline, options.tolerance))
+
+
+if __name__ == '__main__':
+    main()